@@ -1,12 +1,21 @@
 import os
+import json
+import time
 import pickle
+import hashlib
+import sqlite3
+import functools
+import threading
 
+from collections import OrderedDict
 from importlib.resources import files
 
+import gbio.src.metrics as metrics
+
 
 
 class Cache():
-    def __init__(self, cache_dir=None, pickle_name=None):
+    def __init__(self, cache_dir=None, pickle_name=None, silent=False):
         if cache_dir is None:
             self.cache_dir = os.path.join(os.path.dirname(files('gbio')), 'cache')
         else:
@@ -14,7 +23,9 @@ class Cache():
         
         self.pickle_name = pickle_name
 
-        print("Initialized cache directory:", self.cache_dir)
+        self.silent = silent
+        if not silent:
+            print("Initialized cache directory:", self.cache_dir)
 
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir, exist_ok=True)
@@ -26,20 +37,345 @@ class Cache():
             return pickle.load(file, encoding='latin1')
     
     def save_pickle(self, data, pickle_name=None):
-        """Save data to a pickle file."""
+        """Save data to a pickle file atomically."""
         file_path = os.path.join(self.cache_dir, f"{self.pickle_name if pickle_name is None else pickle_name}.pkl")
-        with open(file_path, 'wb') as file:
-            pickle.dump(data, file)
+        _atomic_pickle(data, file_path)
             
     def is_pickle(self, pickle_name=None) -> bool:
         """Check if a pickle file exists."""
-        file_path = os.path.join(self.cache_dir, f"{self.pickle_name if pickle_name is None else self.pickle_name}.pkl")
+        file_path = os.path.join(self.cache_dir, f"{self.pickle_name if pickle_name is None else pickle_name}.pkl")
         res = os.path.exists(file_path)
-        print("Checking if pickle exists at:", file_path, "->", res)
+        if not self.silent:
+            print("Checking if pickle exists at:", file_path, "->", res)
         return res
-    
+
+
+def _atomic_pickle(data, file_path: str) -> None:
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(data, file)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, file_path)
+
+
+class SpeciesStore():
+    """SQLite-backed species cache, loaded lazily by key and persisted incrementally."""
+    def __init__(self, cache_dir=None, db_name="species_cache"):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(files('gbio')), 'cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, f"{db_name}.sqlite")
+
+        self._lock = threading.Lock()
+        self._loaded = {}
+        self._pending = {}
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS species (key INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        self._conn.commit()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        with self._lock:
+            self._loaded[int(key)] = value
+            self._pending[int(key)] = value
+
+    def __len__(self) -> int:
+        with self._lock:
+            (n,) = self._conn.execute("SELECT COUNT(*) FROM species").fetchone()
+            return n + len(self._pending)
+
+    def get(self, key, default=None):
+        key = int(key)
+        with self._lock:
+            if key in self._loaded:
+                return self._loaded[key]
+            row = self._conn.execute("SELECT data FROM species WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            value = json.loads(row[0])
+            self._loaded[key] = value
+            return value
+
+    def commit(self) -> int:
+        """Atomically write only the species added since the last commit."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            with metrics.timer("cache_commit"):
+                rows = [(k, json.dumps(v)) for k, v in self._pending.items()]
+                with self._conn:
+                    self._conn.executemany("INSERT OR REPLACE INTO species (key, data) VALUES (?, ?)", rows)
+            self._pending.clear()
+            return len(rows)
+
+    def import_dict(self, data: dict) -> None:
+        """One-off migration from a legacy pickled species dict."""
+        for key, value in data.items():
+            self[key] = value
+        self.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self._conn.close()
+
+
+
+class OfflineCacheMiss(LookupError):
+    """Raised in offline mode when a response is not in the cache."""
+
+
+class ResponseCache():
+    """On-disk HTTP response cache keyed on (endpoint, normalized params), with TTL and LRU size cap."""
+    def __init__(self, cache_dir=None, db_name="response_cache", ttl: float=30 * 24 * 3600, max_bytes: int=512 * 1024 ** 2):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(files('gbio')), 'cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, f"{db_name}.sqlite")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, body TEXT NOT NULL, "
+            "size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(endpoint: str, params: dict=None) -> str:
+        normalized = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        raw = json.dumps([endpoint, normalized])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, endpoint: str, params: dict=None):
+        """Return the cached JSON body, or None if missing or expired."""
+        key = self.make_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            body, created = row
+            with self._conn:
+                if self.ttl is not None and now - created > self.ttl:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(body)
+
+    def put(self, endpoint: str, params: dict, data) -> None:
+        key = self.make_key(endpoint, params)
+        body = json.dumps(data)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, len(body), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        # Drop least recently used entries until under the size cap
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+
+class Memo():
+    """Argument-keyed memoization with an in-memory LRU front and an on-disk pickle store.
+
+    Keys hash the function's module, qualified name and pickled arguments. Entries
+    expire after `ttl` seconds; memory holds at most `maxsize` entries and disk at
+    most `max_disk_bytes`, evicting least recently used first. Disk writes are atomic.
+    """
+    def __init__(self, fn, maxsize: int=256, ttl: float=None, disk: bool=True,
+                 cache_dir=None, max_disk_bytes: int=256 * 1024 ** 2):
+        self.fn = fn
+        self.fn_id = f"{fn.__module__}.{fn.__qualname__}"
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+
+        self.disk_dir = None
+        if disk:
+            if cache_dir is None:
+                cache_dir = os.path.join(os.path.dirname(files('gbio')), 'cache')
+            self.disk_dir = os.path.join(cache_dir, 'memo', self.fn_id)
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict() # key -> (created, value)
+        self._disk_bytes = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def make_key(self, args: tuple, kwargs: dict) -> str:
+        raw = pickle.dumps((self.fn_id, args, sorted(kwargs.items())), protocol=4)
+        return hashlib.sha256(raw).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key: str, entry: tuple) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str):
+        path = os.path.join(self.disk_dir, f"{key}.pkl")
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if self._expired(entry[0]):
+            self._disk_remove(path)
+            return None
+        os.utime(path) # mtime tracks last access for LRU eviction
+        return entry
+
+    def _disk_remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        if self._disk_bytes is not None:
+            self._disk_bytes -= size
+
+    def _disk_put(self, key: str, entry: tuple) -> None:
+        path = os.path.join(self.disk_dir, f"{key}.pkl")
+        try:
+            _atomic_pickle(entry, path)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Unpicklable results stay memory-only
+            metrics.count("memo_disk_skipped")
+            return
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(e.stat().st_size for e in os.scandir(self.disk_dir) if e.name.endswith('.pkl'))
+        else:
+            self._disk_bytes += os.path.getsize(path)
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        entries = sorted((e for e in os.scandir(self.disk_dir) if e.name.endswith('.pkl')),
+                         key=lambda e: e.stat().st_mtime)
+        self._disk_bytes = sum(e.stat().st_size for e in entries)
+        for e in entries:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._disk_remove(e.path)
+
+    def __call__(self, *args, **kwargs):
+        try:
+            key = self.make_key(args, kwargs)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Unhashable arguments are computed without caching
+            with self._lock:
+                self.bypasses += 1
+            return self.fn(*args, **kwargs)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+            if self.disk_dir is not None:
+                entry = self._disk_get(key)
+                if entry is not None:
+                    self._remember(key, entry)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return entry[1]
+            self.misses += 1
+
+        value = self.fn(*args, **kwargs)
+        entry = (time.time(), value)
+        with self._lock:
+            self._remember(key, entry)
+            if self.disk_dir is not None:
+                self._disk_put(key, entry)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'bypasses': self.bypasses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'memory_entries': len(self._memory),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self.disk_dir is not None:
+                for e in os.scandir(self.disk_dir):
+                    if e.name.endswith('.pkl'):
+                        os.remove(e.path)
+                self._disk_bytes = 0
+
+
+def memoize(fn=None, **options):
+    """Decorator form of Memo: @memoize or @memoize(ttl=3600, maxsize=1024, disk=False)."""
+    def wrap(f):
+        memo = Memo(f, **options)
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            return memo(*args, **kwargs)
+        wrapper.memo = memo
+        wrapper.stats = memo.stats
+        wrapper.cache_clear = memo.clear
+        return wrapper
+    return wrap(fn) if fn is not None else wrap
+
+
+_templates = {}
+
 def c_template(cache_name, compute_fn, *args, **kwargs):
-    cache = Cache(pickle_name=cache_name)
+    if cache_name not in _templates:
+        _templates[cache_name] = Cache(pickle_name=cache_name, silent=True)
+    cache = _templates[cache_name]
     if cache_name and cache.is_pickle():
         return cache.load_pickle()
     else:
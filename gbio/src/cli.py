@@ -0,0 +1,225 @@
+"""`gbio` command line entry point.
+
+Heavy modules (cv2, pandas, ee, requests) are only imported inside the subcommand
+that needs them, so `gbio --help` and argument errors return immediately.
+"""
+import argparse
+import sys
+
+
+def _centers(values: list[str]) -> list[tuple[float, float]]:
+    centers = []
+    for value in values:
+        lat, lon = value.split(',')
+        centers.append((float(lat), float(lon)))
+    return centers
+
+def fetch(args) -> None:
+    import gbio.src.workingquery as wkquery
+
+    wkquery.query_tasks(
+        centers=_centers(args.centers),
+        tile_width_km=args.tile_width_km,
+        tiles_per_side=args.tiles_per_side,
+        folder=args.folder,
+        earth_engine_project=args.project,
+        max_workers=args.workers,
+        mosaic=args.mosaic,
+    )
+
+def slice_mosaic(args) -> None:
+    import gbio.src.tiler as tiler
+
+    (lat, lon), = _centers([args.center])
+    grid = tiler.create_grid(lon, lat, args.tile_width_km, args.tiles_per_side)
+    tiler.slice_mosaic(args.mosaic, grid, args.tile_width_km, args.output,
+                       prefix=args.prefix,
+                       override=args.override)
+
+def process(args) -> None:
+    import gbio.src.process as prc
+
+    if args.occurrence_store or args.offline or args.cache_dir or args.response_cache:
+        import gbio.src.gbif_query as gbq
+        import gbio.src.cache as cache
+        # Record online responses so a later --offline run (same --cache-dir) can replay them
+        response_cache = cache.ResponseCache(cache_dir=args.cache_dir) if args.response_cache else None
+        prc.g = gbq.GBIFIO(silent=False,
+                           offline=args.offline,
+                           response_cache=response_cache,
+                           occurrence_store=args.occurrence_store,
+                           cache_dir=args.cache_dir)
+
+    prc.process_sats(args.raw, args.processed, args.csv,
+                     override=args.override,
+                     skip=args.skip,
+                     concurrent=args.concurrent,
+                     prefetch=args.prefetch,
+                     workers=args.workers,
+                     landcover_path=args.landcover,
+                     virtual=args.virtual,
+                     incremental=args.incremental,
+                     report_path=args.report,
+                     triage=args.triage)
+
+def landcover(args) -> None:
+    import gbio.src.landcover as lcv
+
+    if args.histograms:
+        lcv.process_histograms(args.processed, args.csv, skip=args.skip)
+    else:
+        lcv.process_sats(args.processed, args.output, args.csv, override=args.override, skip=args.skip)
+
+def queue(args) -> None:
+    import gbio.src.workqueue as wq
+
+    if args.action == "init":
+        q = wq.WorkQueue(args.queue)
+        q.enqueue(args.raw, skip=args.skip,
+                  landcover_path=args.landcover,
+                  virtual=args.virtual,
+                  concurrent=args.concurrent,
+                  occurrence_store=args.occurrence_store,
+                  triage=args.triage)
+    elif args.action == "work":
+        wq.run_local_workers(args.queue, args.processed, args.parts,
+                             processes=args.processes,
+                             batch=args.batch,
+                             lease_seconds=args.lease,
+                             cache_dir=args.cache_dir)
+    elif args.action == "merge":
+        wq.merge_parts(args.queue, args.parts, args.csv)
+    elif args.action == "retry":
+        print(f"Requeued {wq.WorkQueue(args.queue).retry_failed()} failed tiles")
+    else:
+        print(wq.WorkQueue(args.queue).progress())
+
+def triage(args) -> None:
+    import os
+    import gbio.src.triage as trg
+
+    os.makedirs(args.reports, exist_ok=True)
+    for city in sorted(os.listdir(args.raw)):
+        city_path = os.path.join(args.raw, city)
+        if city in args.skip or not os.path.isdir(city_path):
+            continue
+        paths = [os.path.join(city_path, f) for f in sorted(os.listdir(city_path)) if not f.startswith('.')]
+        print(f"Triaging city: {city}")
+        trg.save_report(trg.report_path(args.reports, city), trg.triage(paths), len(paths))
+
+def combine(args) -> None:
+    import gbio.src.process as prc
+
+    prc.combine_csvs(args.csv, args.output, format=args.format)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="gbio", description="Geofenced satellite imagery and biodiversity dataset builder.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("fetch", help="export satellite tiles around city centers with Earth Engine")
+    p.add_argument("centers", nargs="+", help="city centers as LAT,LON")
+    p.add_argument("--tile-width-km", type=float, default=1.5)
+    p.add_argument("--tiles-per-side", type=int, default=14)
+    p.add_argument("--folder", default="Manchester_GEE", help="Drive folder to export into")
+    p.add_argument("--project", default="geofenced-biodiversity-project", help="Earth Engine project")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--mosaic", action="store_true", help="one export per city, sliced later with tiler.slice_mosaic")
+    p.set_defaults(func=fetch)
+
+    p = commands.add_parser("slice", help="cut a city mosaic from 'fetch --mosaic' into raw tiles (needs rasterio)")
+    p.add_argument("mosaic", help="mosaic GeoTIFF (EPSG:4326)")
+    p.add_argument("output", help="output folder for the city's raw tiles")
+    p.add_argument("--center", required=True, help="city center as LAT,LON, as passed to fetch")
+    p.add_argument("--tile-width-km", type=float, default=1.5)
+    p.add_argument("--tiles-per-side", type=int, default=14)
+    p.add_argument("--prefix", default="tile")
+    p.add_argument("--override", action="store_true")
+    p.set_defaults(func=slice_mosaic)
+
+    p = commands.add_parser("process", help="build per-city CSVs from raw tiles")
+    p.add_argument("raw", help="raw tiles, one folder per city")
+    p.add_argument("processed", help="output folder for processed tiles")
+    p.add_argument("csv", help="output folder for per-city CSVs")
+    p.add_argument("--override", action="store_true")
+    p.add_argument("--skip", nargs="*", default=[], metavar="CITY")
+    p.add_argument("--concurrent", action="store_true", help="resolve species concurrently")
+    p.add_argument("--prefetch", action="store_true", help="download each city's occurrences once up front")
+    p.add_argument("--workers", type=int, default=1, help="render processes (1 runs serially)")
+    p.add_argument("--landcover", metavar="DIR", help="also write landcover maps into DIR")
+    p.add_argument("--virtual", action="store_true", help="store one base tile per location")
+    p.add_argument("--incremental", action="store_true", help="only rebuild changed tiles")
+    p.add_argument("--report", metavar="PATH", help="write stage metrics to PATH")
+    p.add_argument("--triage", action="store_true", help="skip blank, nodata, cloudy or unreadable tiles")
+    p.add_argument("--occurrence-store", metavar="PATH", help="answer GBIF queries from a local occurrence export")
+    p.add_argument("--response-cache", action="store_true",
+                   help="record GBIF responses in the response cache under --cache-dir")
+    p.add_argument("--offline", action="store_true",
+                   help="serve GBIF requests only from a response cache recorded by an earlier --response-cache run "
+                        "with the same --cache-dir (not needed with --occurrence-store)")
+    p.add_argument("--cache-dir", metavar="DIR", help="species and response caches (default: the package cache directory)")
+    p.set_defaults(func=process)
+
+    p = commands.add_parser("landcover", help="landcover maps (or histograms) for processed tiles")
+    p.add_argument("processed", help="processed tiles, one folder per city")
+    p.add_argument("output", nargs="?", help="output folder for landcover maps")
+    p.add_argument("csv", help="folder with the per-city CSVs")
+    p.add_argument("--override", action="store_true")
+    p.add_argument("--skip", nargs="*", default=[], metavar="CITY")
+    p.add_argument("--histograms", action="store_true", help="store per-tile histograms for threshold sweeps instead")
+    p.set_defaults(func=landcover)
+
+    p = commands.add_parser("queue", help="split a build across processes or hosts sharing a filesystem")
+    actions = p.add_subparsers(dest="action", required=True)
+    a = actions.add_parser("init", help="queue every raw tile (build options are stored with the queue)")
+    a.add_argument("queue", help="queue database on shared storage")
+    a.add_argument("raw", help="raw tiles, one folder per city")
+    a.add_argument("--skip", nargs="*", default=[], metavar="CITY")
+    a.add_argument("--landcover", metavar="DIR", help="also write landcover maps into DIR")
+    a.add_argument("--virtual", action="store_true")
+    a.add_argument("--concurrent", action="store_true")
+    a.add_argument("--occurrence-store", metavar="PATH", help="answer GBIF queries from a local occurrence export")
+    a.add_argument("--triage", action="store_true", help="skip blank, nodata, cloudy or unreadable tiles")
+    a = actions.add_parser("work", help="claim and build tiles until none are left")
+    a.add_argument("queue")
+    a.add_argument("processed", help="output folder for processed tiles")
+    a.add_argument("parts", help="folder for partial results")
+    a.add_argument("--processes", type=int, default=1, help="independent workers to run on this host")
+    a.add_argument("--batch", type=int, default=8, help="tiles per lease")
+    a.add_argument("--lease", type=float, default=600, help="lease length in seconds")
+    a.add_argument("--cache-dir", metavar="DIR", help="GBIF caches; keep off shared storage (default: a node-local temp dir)")
+    a = actions.add_parser("merge", help="merge partial results into the city CSVs")
+    a.add_argument("queue")
+    a.add_argument("parts")
+    a.add_argument("csv", help="output folder for per-city CSVs")
+    a = actions.add_parser("retry", help="requeue failed tiles")
+    a.add_argument("queue")
+    a = actions.add_parser("status", help="tile counts per state")
+    a.add_argument("queue")
+    p.set_defaults(func=queue)
+
+    p = commands.add_parser("triage", help="score raw tiles and report the ones a --triage build would skip")
+    p.add_argument("raw", help="raw tiles, one folder per city")
+    p.add_argument("reports", help="output folder for <city>.triage.json reports")
+    p.add_argument("--skip", nargs="*", default=[], metavar="CITY")
+    p.set_defaults(func=triage)
+
+    p = commands.add_parser("combine", help="combine per-city CSVs into one table")
+    p.add_argument("csv", help="folder with the per-city CSVs")
+    p.add_argument("output", help="combined .csv file or Parquet dataset directory")
+    p.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    p.set_defaults(func=combine)
+    return parser
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.func is landcover and not args.histograms and args.output is None:
+        build_parser().error("landcover: output is required unless --histograms is given")
+    if args.func is process and args.prefetch and args.occurrence_store:
+        build_parser().error("process: --prefetch needs the GBIF API and cannot be combined with --occurrence-store")
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,17 +2,40 @@ import numpy as np
 
 import requests
 import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from requests.adapters import HTTPAdapter
 
 import gbio
 import gbio.src.parse.yaml as yml
 import gbio.src.cache as cache
+import gbio.src.occurrences as occ
+import gbio.src.metrics as metrics
+import gbio.src.scheduler as sched
 
 from importlib.resources import files
 
 CONFIG_PATH: str = str(files(gbio).joinpath("config.yml"))
 
+
+class GBIFRequestError(Exception):
+    """A lookup that gave up; `reason` is a short code such as 'species_lookup_http_503'."""
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
 class GBIFIO:
-    def __init__(self, config_path: str=CONFIG_PATH, silent: bool=True) -> None:
+    def __init__(self, 
+                 config_path: str=CONFIG_PATH, 
+                 silent: bool=True, 
+                 max_workers: int=16,
+                 response_cache: cache.ResponseCache=None,
+                 offline: bool=False,
+                 occurrence_store: str=None,
+                 cache_dir: str=None,
+                 scheduler: sched.RequestScheduler=None) -> None:
         # No functionality needed, will load url from config
         self.config_data = yml.load_yaml(config_path)
         try:
@@ -25,10 +48,52 @@ class GBIFIO:
         if not silent:
             print(f"   Dataset loaded: {self.config_data}")
 
-        self.species_cache = {}
-        self.cache = cache.Cache(pickle_name="species_cache")
-        if self.cache.is_pickle():
-            self.species_cache = self.cache.load_pickle()
+        # Pooled keep-alive session shared by all requests
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Rate limit, adaptive concurrency, timeouts and retries for every request
+        self.scheduler = scheduler or sched.RequestScheduler.from_config(
+            self.config_data.get('request-limits'),
+            max_concurrency=max_workers)
+        self._local = threading.local() # per-thread reason of the last failed request
+
+        # Optional on-disk response cache; offline mode serves only from it
+        self.response_cache = response_cache
+        self.offline = offline
+        if self.offline and self.response_cache is None:
+            self.response_cache = cache.ResponseCache(cache_dir=cache_dir)
+
+        # City-level occurrence index, answers geofence queries locally when set
+        self.occurrence_index = None
+        # When True, geofence and species lookups never leave the local occurrence store
+        self.local_only = False
+        if occurrence_store is not None:
+            self.load_occurrence_store(occurrence_store)
+
+        # Species store is opened on first use, so constructing GBIFIO stays cheap
+        self.cache_dir = cache_dir
+        self._species_cache = None
+        self._species_cache_lock = threading.Lock()
+        # Species lookups in flight, so concurrent tiles wait for one request per key
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def species_cache(self) -> cache.SpeciesStore:
+        if self._species_cache is None:
+            with self._species_cache_lock:
+                if self._species_cache is None:
+                    store = cache.SpeciesStore(cache_dir=self.cache_dir)
+                    legacy = cache.Cache(cache_dir=self.cache_dir, pickle_name="species_cache")
+                    if len(store) == 0 and legacy.is_pickle():
+                        # Migrate the legacy whole-dict pickle into the incremental store
+                        store.import_dict(legacy.load_pickle())
+                    self._species_cache = store
+        return self._species_cache
 
     # Packaging variables for requests
     def request_by_geofence(self, 
@@ -37,6 +102,10 @@ class GBIFIO:
         lon_deg, lat_deg = self.km_to_deg(
             km=dim, 
             lat=coord[0])
+        if self.occurrence_index is not None:
+            box = (coord[0] - lat_deg, coord[0] + lat_deg, coord[1] - lon_deg, coord[1] + lon_deg)
+            if self.local_only or self.occurrence_index.covers(*box):
+                return self.occurrence_index.facet_response(*box)
         params = {
             'geometry': self.generate_request_polygon(
                 lat=coord[0], 
@@ -76,11 +145,18 @@ class GBIFIO:
                 buckets['NE'].append(record)
         return buckets
 
-    def process_output(self, data: dict):
+    def process_output(self, data: dict, concurrent: bool = False, return_species: bool = False):
+        """Richness and redlist counts for a facet response.
+
+        With return_species, also returns the (species key, occurrence count) pairs.
+        """
         if data is None:
-            return None
+            return (None, None) if return_species else None
         s_entries = data.get('facets', [])[0].get('counts', [])
 
+        if concurrent:
+            self.resolve_species([int(entry.get('name')) for entry in s_entries])
+
         redlist_buckets = {
             'redlist_EX': 0,
             'redlist_EW': 0,
@@ -97,6 +173,8 @@ class GBIFIO:
         for entry in s_entries:
             species_key = int(entry.get('name'))
             species_info = self.get_species_name(species_key)
+            if species_info is None:
+                raise GBIFRequestError(f"species_lookup_{self.last_failure() or 'failed'}")
             redlist_buckets[f"redlist_{species_info.get('redlist', {}).get('code')}"] += 1
             species.append(species_info)
 
@@ -105,29 +183,41 @@ class GBIFIO:
         }
         final_entry.update(redlist_buckets)
 
-        
+        if return_species:
+            return final_entry, [(int(entry.get('name')), int(entry.get('count', 0))) for entry in s_entries]
         return final_entry
     
     def request(self, 
                 params: dict,
                 endpoint: str = None,
                 ):
-        try:
-            res = requests.get(
-                endpoint or self.endpoint,
-                params=params,
-                )
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to get request: {e}")
-            return None
-        
-        if res.status_code != 200:
-            print(f"Failed: Returned status code of {res.status_code}, with message: {res}")
+        endpoint = endpoint or self.endpoint
+        self._local.failure = None
+        if self.response_cache is not None:
+            cached = self.response_cache.get(endpoint, params)
+            if cached is not None:
+                metrics.count("response_cache_hit")
+                return cached
+            metrics.count("response_cache_miss")
+            if self.offline:
+                raise cache.OfflineCacheMiss(f"No cached response for {endpoint} with params {params}")
+
+        res, reason = self.scheduler.send(
+            lambda timeout: self.session.get(endpoint, params=params, timeout=timeout))
+        if reason is not None:
+            self._local.failure = reason
+            print(f"Failed: {reason} for {endpoint}, with response: {res}")
             return None
-        
+
         data = res.json()
+        if self.response_cache is not None:
+            self.response_cache.put(endpoint, params, data)
         return data
 
+    def last_failure(self) -> str:
+        """Reason the calling thread's most recent failed request gave up (e.g. 'http_429', 'timeout')."""
+        return getattr(self._local, 'failure', None)
+
     def km_to_deg(self, km: float, lat: float):
         lat_deg = km / 111.0
         lon_deg = km / (111.320 * np.cos(np.deg2rad(lat)))
@@ -147,22 +237,187 @@ class GBIFIO:
     
 
     def get_species_name(self, species_key: int):
+        self._local.failure = None
         if species_key in self.species_cache:
+            metrics.count("species_cache_hit")
+            return self.species_cache[species_key]
+
+        with self._inflight_lock:
+            future = self._inflight.get(species_key)
+            leader = future is None
+            if leader:
+                future = self._inflight[species_key] = Future()
+        if not leader:
+            metrics.count("species_lookup_coalesced")
+            data, self._local.failure = future.result()
+            return data
+
+        try:
+            data = self._fetch_species(species_key)
+            future.set_result((data, self._local.failure))
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[species_key]
+        return data
+
+    def _fetch_species(self, species_key: int):
+        if species_key in self.species_cache: # filled by a lookup that finished just before ours started
             return self.species_cache[species_key]
-        
+        metrics.count("species_cache_miss")
+        if self.local_only:
+            info = self.occurrence_index.species_info(species_key)
+            if info is None:
+                self._local.failure = "not_in_store"
+            return info
+
         params = {
             'speciesKey': species_key
         }
         data = self.request(params=params,
                             endpoint=f"{self.endpoint_species}/{species_key}"
                             )
+        if not data:
+            return None # last_failure() holds this request's reason
         redlist = self.request(params=params,
                             endpoint=f"{self.endpoint_species}/{species_key}/iucnRedListCategory"
                             )
-        if data and redlist:
-            data['redlist'] = redlist # Add redlist info if available
-            self.species_cache[species_key] = data
-            print("Pulling from GBIF API with species key:", species_key)
-            return data
+        if not redlist:
+            return None
+        data['redlist'] = redlist # Add redlist info if available
+        self.species_cache[species_key] = data
+        print("Pulling from GBIF API with species key:", species_key)
+        return data
+
+    def resolve_species(self, 
+                        species_keys: list[int],
+                        max_workers: int = None):
+        """Fetch all unseen species keys in parallel, filling species_cache."""
+        unseen = list(dict.fromkeys(k for k in species_keys if k not in self.species_cache))
+        if not unseen:
+            return
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as pool:
+            list(pool.map(self.get_species_name, unseen))
+
+    def fetch_occurrences(self,
+                          bbox: tuple[float, float, float, float], # (lat_min, lat_max, lon_min, lon_max)
+                          page_size: int = 300,
+                          max_records: int = 20000,
+                          min_size_km: float = 2.0,
+                          max_depth: int = 8,
+                          _depth: int = 0):
+        """Animalia occurrence points in a bounding box, as (records, dense boxes).
+
+        Each box costs one limit=0 count query. Boxes holding more than `max_records`
+        occurrences are split into quadrants; a box that is still too dense once it is
+        smaller than `min_size_km` (or `max_depth` splits deep) is not paged at all and
+        is returned as dense instead. Tiles there keep their per-tile speciesKey facet
+        query (request_by_geofence), which is one request however many records share
+        the box. Returns None if a request fails.
+        """
+        lat_min, lat_max, lon_min, lon_max = bbox
+        params = {
+            'geometry': self.generate_request_polygon(
+                lat=(lat_min + lat_max) / 2.0,
+                lon=(lon_min + lon_max) / 2.0,
+                dim=(lon_max - lon_min, lat_max - lat_min)
+                ),
+            'limit': 0,
+            'hasCoordinate': True,
+            'taxonKey': 1, # Animalia
+        }
+        head = self.request(params=params)
+        if head is None:
+            return None
+        total = head.get('count', 0)
+
+        # GBIF refuses offsets past 100000, so never plan to page further than that
+        if total > min(max_records, 100000):
+            lon_deg, lat_deg = self.km_to_deg(km=min_size_km, lat=max(abs(lat_min), abs(lat_max)))
+            if _depth >= max_depth or (lat_max - lat_min <= lat_deg and lon_max - lon_min <= lon_deg):
+                metrics.count("prefetch_dense_boxes")
+                return [], [bbox]
+            lat_mid = (lat_min + lat_max) / 2.0
+            lon_mid = (lon_min + lon_max) / 2.0
+            records, dense = [], []
+            for sub in [(lat_min, lat_mid, lon_min, lon_mid), (lat_min, lat_mid, lon_mid, lon_max),
+                        (lat_mid, lat_max, lon_min, lon_mid), (lat_mid, lat_max, lon_mid, lon_max)]:
+                result = self.fetch_occurrences(sub, page_size=page_size, max_records=max_records,
+                                                min_size_km=min_size_km, max_depth=max_depth, _depth=_depth + 1)
+                if result is None:
+                    return None
+                records.extend(result[0])
+                dense.extend(result[1])
+            return records, dense
+
+        records = []
+        offset = 0
+        while offset < total:
+            page = self.request(params={**params, 'limit': page_size, 'offset': offset})
+            if page is None:
+                return None
+            for r in page.get('results', []):
+                if 'speciesKey' in r and 'decimalLatitude' in r and 'decimalLongitude' in r:
+                    records.append((r['speciesKey'], r['decimalLatitude'], r['decimalLongitude'], r.get('iucnRedListCategory', 'NE')))
+            if page.get('endOfRecords', True):
+                break
+            offset += page_size
+        return records, []
+
+    def prefetch_occurrences(self,
+                             bbox: tuple[float, float, float, float], # (lat_min, lat_max, lon_min, lon_max)
+                             cell_deg: float = 0.01,
+                             max_records: int = 20000,
+                             min_size_km: float = 2.0):
+        """Fetch a whole city's occurrences once and index them for local per-tile geofence queries.
+
+        Tiles overlapping a box too dense to page (see fetch_occurrences) still go to GBIF.
+        Raises ValueError with a local occurrence store loaded, which already answers
+        every query and would otherwise be replaced.
+        """
+        if self.local_only:
+            raise ValueError("Prefetching needs the GBIF API; it cannot be combined with a local occurrence store")
+        result = self.fetch_occurrences(bbox, max_records=max_records, min_size_km=min_size_km)
+        if result is None:
+            print(f"Failed to prefetch occurrences for bbox: {bbox}")
+            self.occurrence_index = None
+            return None
+        records, dense = result
+
+        keys, lats, lons, redlist = zip(*records) if records else ([], [], [], [])
+        index = occ.OccurrenceIndex(
+            species_keys=np.array(keys, dtype=np.int64),
+            lats=np.array(lats, dtype=np.float64),
+            lons=np.array(lons, dtype=np.float64),
+            redlist=occ.encode_redlist(redlist),
+            cell_deg=cell_deg,
+            )
+        index.bounds = bbox
+        index.dense = dense
+        self.occurrence_index = index
+        print(f"Prefetched {len(index)} occurrences for bbox: {bbox} ({len(dense)} dense boxes left to per-tile queries)")
+        return index
+
+    def load_occurrence_store(self, 
+                              path: str,
+                              cell_deg: float = 0.01):
+        """Use a local GBIF occurrence export as the backend, with no network at all.
+
+        `path` is either a prebuilt .npz store or a raw export (.zip Darwin Core Archive,
+        .csv/.txt); raw exports are ingested once and saved next to the source as .npz.
+        """
+        if path.endswith('.npz'):
+            index = occ.OccurrenceIndex.load(path)
         else:
-            return None
\ No newline at end of file
+            store_path = f"{os.path.splitext(path)[0]}.npz"
+            if os.path.exists(store_path) and os.path.getmtime(store_path) >= os.path.getmtime(path):
+                index = occ.OccurrenceIndex.load(store_path)
+            else:
+                index = occ.OccurrenceIndex.from_export(path, cell_deg=cell_deg)
+                index.save(store_path)
+        self.occurrence_index = index
+        self.local_only = True
+        print(f"Loaded local occurrence store with {len(index)} records: {path}")
+        return index
@@ -7,17 +7,29 @@ import pandas as pd
 from tqdm import tqdm
 
 
+GREEN_THRESHOLD = 100
+
+
+def landcover_name(img_name: str) -> str:
+    return f"{img_name.replace('.jpg', '')}_landcover.jpg"
+
+def compute_landcover(img) -> tuple[np.ndarray, float]:
+    """Vegetation mask (uint8, 0/255) and vegetation fraction of an in-memory BGR image."""
+    green_channel = img[:, :, 1]
+    vegetation_mask = green_channel > GREEN_THRESHOLD
+
+    lc_percent = vegetation_mask.sum() / vegetation_mask.size
+
+    return vegetation_mask.astype(np.uint8) * 255, lc_percent
+
 def create_landcover_map(img_path: str, output_path: str) -> float:
     # Read image
     img = cv2.imread(img_path)
     if img is None:
         raise ValueError(f"Image not found at {img_path}")
-    green_channel = img[:, :, 1]
-    vegetation_mask = green_channel > 100
-
-    cv2.imwrite(output_path, vegetation_mask.astype(np.uint8) * 255)
+    mask, lc_percent = compute_landcover(img)
 
-    lc_percent = vegetation_mask.sum() / vegetation_mask.size
+    cv2.imwrite(output_path, mask)
 
     return lc_percent
 
@@ -45,16 +57,113 @@ def process_sats(input_path_raw: str,
         output_city_dir = os.path.join(output_path, city)
         os.makedirs(output_city_dir, exist_ok=True)
 
+        # Virtual variations share one stored base tile, so threshold it only once
+        virtual = 'source_name' in df.columns
+        computed = {}
+
         for row in tqdm(df.itertuples()):
-            img_name = row.full_name
-            input_img_path = os.path.join(input_city_path, img_name)
-            output_name = f"{img_name.replace('.jpg', '')}_landcover.jpg"
-            output_img_path = os.path.join(output_city_dir, output_name)
+            img_name = row.source_name if virtual else row.full_name
+            output_name = landcover_name(img_name)
+            if img_name not in computed:
+                input_img_path = os.path.join(input_city_path, img_name)
+                output_img_path = os.path.join(output_city_dir, output_name)
+                computed[img_name] = create_landcover_map(input_img_path, output_img_path)
 
-            lc_percent = create_landcover_map(input_img_path, output_img_path)
-            lc_percent_col.append(lc_percent)
+            lc_percent_col.append(computed[img_name])
             lc_obj_col.append(output_name)
 
         df['landcover_percent'] = lc_percent_col
         df['landcover_object'] = lc_obj_col
         df.to_csv(csv_file, index=False)
+
+
+# ------------------------------
+# Histogram engine: decode once, recalibrate thresholds from cached statistics
+# ------------------------------
+
+# index name -> (lowest value, number of bins); values are integers in [low, low + bins)
+INDEX_RANGES = {
+    'blue': (0, 256),
+    'green': (0, 256),
+    'red': (0, 256),
+    'exg': (-510, 1021), # excess green, 2G - R - B
+}
+
+def index_values(img: np.ndarray, index: str) -> np.ndarray:
+    """Integer per-pixel values of a vegetation index for a BGR uint8 image."""
+    if index in ('blue', 'green', 'red'):
+        return img[:, :, ['blue', 'green', 'red'].index(index)]
+    if index == 'exg':
+        b, g, r = (img[:, :, c].astype(np.int16) for c in range(3))
+        return 2 * g - r - b
+    raise ValueError(f"Unknown index: {index}")
+
+def tile_histograms(img: np.ndarray) -> dict[str, np.ndarray]:
+    """One histogram per index in INDEX_RANGES for a single tile."""
+    hists = {}
+    for index, (low, bins) in INDEX_RANGES.items():
+        values = index_values(img, index).ravel().astype(np.int64) - low
+        hists[index] = np.bincount(values, minlength=bins).astype(np.uint32)
+    return hists
+
+def build_histograms(img_paths: list[str]) -> dict[str, np.ndarray]:
+    """Decode every tile once and stack its histograms: index -> (N, bins) uint32."""
+    stacked = {index: np.zeros((len(img_paths), bins), dtype=np.uint32) for index, (_, bins) in INDEX_RANGES.items()}
+    for i, path in enumerate(tqdm(img_paths)):
+        img = cv2.imread(path)
+        if img is None:
+            raise ValueError(f"Image not found at {path}")
+        for index, hist in tile_histograms(img).items():
+            stacked[index][i] = hist
+    return stacked
+
+def fractions_above(hists: np.ndarray, thresholds, index: str = 'green') -> np.ndarray:
+    """Fraction of pixels with value > threshold for every tile and threshold, shape (N, T).
+
+    fractions_above(h, [GREEN_THRESHOLD])[:, 0] equals the landcover_percent of
+    compute_landcover for the same pixels.
+    """
+    low, bins = INDEX_RANGES[index]
+    hists = np.asarray(hists, dtype=np.int64)
+    cdf = np.cumsum(hists, axis=1)
+    totals = cdf[:, -1:]
+    # Number of pixels <= t is cdf[t - low]; clip thresholds outside the index range
+    positions = np.clip(np.asarray(thresholds, dtype=np.int64) - low, -1, bins - 1)
+    at_or_below = np.where(positions >= 0, cdf[:, np.maximum(positions, 0)], 0)
+    return (totals - at_or_below) / np.maximum(totals, 1)
+
+def process_histograms(input_path_raw: str,
+                       csv_path: str,
+                       skip: list[str] = None) -> None:
+    """Store per-tile histograms for every city table as <city>_histograms.npz next to its CSV.
+
+    Rows sharing a stored image (virtual variations) share one histogram, since the
+    flips and rotation do not change pixel statistics.
+    """
+    if skip is None:
+        skip = []
+
+    for city_folder in os.listdir(input_path_raw):
+        input_city_path = os.path.join(input_path_raw, city_folder)
+        city = os.path.basename(input_city_path)
+        if city_folder.endswith('.DS_Store') or city in skip:
+            continue
+        print(f"Building histograms for city: {city}")
+
+        df = pd.read_csv(os.path.join(csv_path, f"{city}.csv"))
+        names = df['source_name'] if 'source_name' in df.columns else df['full_name']
+        codes, unique_names = pd.factorize(names)
+        hists = build_histograms([os.path.join(input_city_path, n) for n in unique_names])
+        np.savez_compressed(os.path.join(csv_path, f"{city}_histograms.npz"),
+                            full_name=df['full_name'].to_numpy(dtype=str),
+                            **{index: h[codes] for index, h in hists.items()})
+
+def landcover_sweep(histogram_file: str,
+                    thresholds,
+                    index: str = 'green') -> pd.DataFrame:
+    """Vegetation fractions for a whole sweep of thresholds from stored histograms (rows x thresholds)."""
+    with np.load(histogram_file) as data:
+        fractions = fractions_above(data[index], thresholds, index=index)
+        names = data['full_name']
+    return pd.DataFrame(fractions, index=pd.Index(names, name="full_name"),
+                        columns=[f"{index}>{t}" for t in thresholds])
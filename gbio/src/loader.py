@@ -0,0 +1,140 @@
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+
+import gbio.src.transforms as tfm
+import gbio.src.tilestore as ts
+
+REDLIST_COLUMNS = [f"redlist_{c}" for c in ['EX', 'EW', 'CR', 'EN', 'VU', 'NT', 'LC', 'DD', 'NE']]
+LABEL_COLUMNS = ['species_richness'] + REDLIST_COLUMNS
+
+_END = object()
+
+
+class TileLoader:
+    """Streams (images, masks, labels) batches over combined.csv with background prefetch.
+
+    Images are (B, 150, 225, 3) uint8, masks (B, 150, 225) uint8 and labels
+    (B, len(label_columns)) float32. At most `prefetch` batches are decoded ahead,
+    which bounds memory. `shard=(index, count)` keeps only rows with id % count == index,
+    so independent processes read disjoint parts without coordinating.
+    """
+    def __init__(self,
+                 csv_path: str,
+                 img_root: str,
+                 mask_root: str = None,
+                 batch_size: int = 32,
+                 shuffle: bool = False,
+                 seed: int = 0,
+                 cities: list[str] = None,
+                 variations: list[int] = None,
+                 label_columns: list[str] = None,
+                 shard: tuple[int, int] = (0, 1),
+                 prefetch: int = 2,
+                 num_threads: int = 4,
+                 drop_last: bool = False,
+                 store: ts.TileStore = None):
+        df = pd.read_csv(csv_path, index_col="id")
+        if cities is not None:
+            df = df[df['city'].isin(cities)]
+        if variations is not None:
+            df = df[df['variation'].isin(variations)]
+        shard_index, shard_count = shard
+        df = df[df.index.to_numpy() % shard_count == shard_index]
+
+        self.df = df
+        self.img_root = img_root
+        self.mask_root = mask_root
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.label_columns = label_columns or LABEL_COLUMNS
+        self.prefetch = prefetch
+        self.num_threads = num_threads
+        self.drop_last = drop_last
+        self.store = store
+        self.epoch = 0
+
+        self._labels = df[self.label_columns].to_numpy(dtype=np.float32)
+        self._virtual = 'source_name' in df.columns
+
+    def __len__(self) -> int:
+        n = len(self.df)
+        return n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+
+    def _load(self, pos: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.store is not None:
+            img, mask = self.store.get(int(self.df.index[pos]))
+            return img, mask
+
+        row = self.df.iloc[pos]
+        city_dir = str(row['city'])
+        # Mixed tables: rows of cities built without --virtual have no source and are stored as-is
+        if self._virtual and pd.notna(row['source_name']):
+            name, variation = row['source_name'], int(row['variation'])
+        else:
+            name, variation = row['full_name'], tfm.IDENTITY
+        img = tfm.load_variation(os.path.join(self.img_root, city_dir, name), variation)
+
+        mask = np.zeros(ts.MASK_SHAPE, dtype=np.uint8)
+        if self.mask_root is not None and 'landcover_object' in row:
+            mask = tfm.load_variation(os.path.join(self.mask_root, city_dir, row['landcover_object']),
+                                      variation, flags=cv2.IMREAD_GRAYSCALE)
+        return ts.fit_shape(img, ts.TILE_SHAPE), ts.fit_shape(mask, ts.MASK_SHAPE)
+
+    def _batches(self) -> list[np.ndarray]:
+        order = np.arange(len(self.df))
+        if self.shuffle:
+            np.random.default_rng((self.seed, self.epoch)).shuffle(order)
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+            batches.pop()
+        return batches
+
+    def _produce(self, batches, out: queue.Queue, stop: threading.Event) -> None:
+        try:
+            with ThreadPoolExecutor(max_workers=self.num_threads) as pool:
+                for positions in batches:
+                    if stop.is_set():
+                        return
+                    images = np.empty((len(positions),) + ts.TILE_SHAPE, dtype=np.uint8)
+                    masks = np.empty((len(positions),) + ts.MASK_SHAPE, dtype=np.uint8)
+                    for i, (img, mask) in enumerate(pool.map(self._load, positions)):
+                        images[i] = img
+                        masks[i] = mask
+                    out.put((images, masks, self._labels[positions]))
+        except Exception as e:
+            out.put(e)
+        finally:
+            out.put(_END)
+
+    def __iter__(self):
+        batches = self._batches()
+        self.epoch += 1
+
+        out = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(batches, out, stop), daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = out.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Drain so a blocked producer can observe the stop flag and exit
+            while producer.is_alive():
+                try:
+                    out.get(timeout=0.1)
+                except queue.Empty:
+                    pass
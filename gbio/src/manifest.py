@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(path: str) -> str:
+    """Content hash of an input file."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def params_hash(params: dict) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+def manifest_path(csv_path: str, city: str) -> str:
+    return os.path.join(csv_path, f"{city}.manifest.json")
+
+def load_manifest(path: str) -> dict:
+    """Load a city build manifest, or an empty one if missing or unreadable."""
+    empty = {'version': MANIFEST_VERSION, 'params': None, 'tiles': {}}
+    if not os.path.exists(path):
+        return empty
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable manifest {path}: {e}")
+        return empty
+    if manifest.get('version') != MANIFEST_VERSION:
+        return empty
+    return manifest
+
+def save_manifest(path: str, manifest: dict) -> None:
+    """Write the manifest atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def stale_tiles(manifest: dict,
+                params: dict,
+                hashes: dict[str, str],
+                table_rows: dict[str, list[str]]) -> list[str]:
+    """Tiles whose content or build parameters changed since the manifest was written.
+
+    `table_rows` maps raw tile name to the row names actually present in the city
+    table (None if the table is missing). Tiles whose rows there differ from the
+    manifest are stale too, so a deleted or truncated table is rebuilt rather than
+    silently losing the tiles the manifest still lists as built.
+    """
+    if table_rows is None or manifest.get('params') != params_hash(params):
+        return list(hashes)
+    tiles = manifest.get('tiles', {})
+    stale = []
+    for name, h in hashes.items():
+        tile = tiles.get(name, {})
+        if tile.get('hash') != h or sorted(tile.get('rows', [])) != sorted(table_rows.get(name, [])):
+            stale.append(name)
+    return stale
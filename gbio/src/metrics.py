@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import time
+import threading
+
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for latency histograms, Prometheus style
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def metric_name(name: str) -> str:
+    """Prometheus-safe metric name: anything outside [a-zA-Z0-9_] becomes '_'."""
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+def _label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _NullTimer():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics():
+    """Process-wide stage timers, counters and latency histograms for the dataset build.
+
+    Disabled metrics short-circuit every call, so instrumentation left in hot paths
+    costs a single attribute check. Set GBIO_METRICS=0 to start disabled.
+    """
+    def __init__(self, enabled: bool=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.timers = {}     # stage -> [count, total_seconds, max_seconds]
+            self.counters = {}   # name -> int
+            self.histograms = {} # name -> [bucket counts..., +Inf count, sum]
+            self.started = time.time()
+
+    @contextmanager
+    def _timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def timer(self, stage: str):
+        """Context manager timing one occurrence of a stage."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timed(stage)
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            t = self.timers.setdefault(stage, [0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += seconds
+            t[2] = max(t[2], seconds)
+
+    def count(self, name: str, n: int=1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float, buckets: list[float]=LATENCY_BUCKETS) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            h = self.histograms.setdefault(name, [0] * (len(buckets) + 1) + [0.0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h[i] += 1
+                    break
+            else:
+                h[len(buckets)] += 1
+            h[-1] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'timers': {k: list(v) for k, v in self.timers.items()},
+                'counters': dict(self.counters),
+                'histograms': {k: list(v) for k, v in self.histograms.items()},
+            }
+
+    def merge(self, snapshot: dict) -> None:
+        """Fold in a snapshot taken in another process (e.g. a pool worker)."""
+        if not self.enabled or not snapshot:
+            return
+        with self._lock:
+            for stage, (n, total, worst) in snapshot['timers'].items():
+                t = self.timers.setdefault(stage, [0, 0.0, 0.0])
+                t[0] += n
+                t[1] += total
+                t[2] = max(t[2], worst)
+            for name, n in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            for name, values in snapshot['histograms'].items():
+                h = self.histograms.setdefault(name, [0] * (len(values) - 1) + [0.0])
+                for i, v in enumerate(values):
+                    h[i] += v
+
+    def report(self) -> dict:
+        snap = self.snapshot()
+        return {
+            'wall_seconds': time.time() - self.started,
+            'stages': {
+                stage: {'count': n, 'total_seconds': total, 'mean_seconds': total / n if n else 0.0, 'max_seconds': worst}
+                for stage, (n, total, worst) in sorted(snap['timers'].items())
+            },
+            'counters': dict(sorted(snap['counters'].items())),
+            'histograms': {
+                name: {
+                    'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], values[:-1])),
+                    'count': sum(values[:-1]),
+                    'sum': values[-1],
+                }
+                for name, values in sorted(snap['histograms'].items())
+            },
+        }
+
+    def prometheus(self) -> str:
+        """Render the current metrics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = [
+            "# TYPE gbio_stage_seconds_total counter",
+            "# TYPE gbio_stage_calls_total counter",
+        ]
+        for stage, (n, total, _) in sorted(snap['timers'].items()):
+            stage = _label_value(stage)
+            lines.append(f'gbio_stage_seconds_total{{stage="{stage}"}} {total}')
+            lines.append(f'gbio_stage_calls_total{{stage="{stage}"}} {n}')
+        counters = {}
+        for name, n in snap['counters'].items():
+            counters[metric_name(name)] = counters.get(metric_name(name), 0) + n
+        for name, n in sorted(counters.items()):
+            lines.append(f"# TYPE gbio_{name}_total counter")
+            lines.append(f"gbio_{name}_total {n}")
+        for name, values in sorted(snap['histograms'].items()):
+            name = metric_name(name)
+            lines.append(f"# TYPE gbio_{name} histogram")
+            cumulative = 0
+            for bound, v in zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], values[:-1]):
+                cumulative += v
+                lines.append(f'gbio_{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"gbio_{name}_sum {values[-1]}")
+            lines.append(f"gbio_{name}_count {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path_prefix: str) -> None:
+        """Write <prefix>.json (run report) and <prefix>.prom (Prometheus textfile), atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(path_prefix)), exist_ok=True)
+        for suffix, text in [('.json', json.dumps(self.report(), indent=2)), ('.prom', self.prometheus())]:
+            tmp_path = f"{path_prefix}{suffix}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, f"{path_prefix}{suffix}")
+        print(f"Metrics report written to {path_prefix}.json and {path_prefix}.prom")
+
+
+METRICS = Metrics(enabled=os.environ.get("GBIO_METRICS", "1") != "0")
+
+timer = METRICS.timer
+count = METRICS.count
+observe = METRICS.observe
+
+def enable() -> None:
+    METRICS.enabled = True
+
+def disable() -> None:
+    METRICS.enabled = False
@@ -0,0 +1,255 @@
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+REDLIST_CODES = ['EX', 'EW', 'CR', 'EN', 'VU', 'NT', 'LC', 'DD', 'NE']
+
+EXPORT_COLUMNS = ['speciesKey', 'decimalLatitude', 'decimalLongitude', 'iucnRedListCategory', 'kingdomKey', 'kingdom']
+
+# GBIF backbone kingdom keys, for exports (e.g. SIMPLE_CSV) that only carry the kingdom name
+KINGDOMS = {0: 'incertae sedis', 1: 'Animalia', 2: 'Archaea', 3: 'Bacteria', 4: 'Chromista',
+            5: 'Fungi', 6: 'Plantae', 7: 'Protozoa', 8: 'Viruses'}
+
+
+def encode_redlist(codes) -> np.ndarray:
+    """Map IUCN category strings to compact uint8 indices into REDLIST_CODES (unknown -> NE)."""
+    lookup = {c: i for i, c in enumerate(REDLIST_CODES)}
+    ne = lookup['NE']
+    return np.array([lookup.get(c, ne) for c in codes], dtype=np.uint8)
+
+
+class OccurrenceIndex:
+    """In-memory uniform grid index over occurrence points (lat/lon in degrees)."""
+    def __init__(self,
+                 species_keys: np.ndarray,
+                 lats: np.ndarray,
+                 lons: np.ndarray,
+                 redlist: np.ndarray = None, # uint8 indices into REDLIST_CODES
+                 cell_deg: float = 0.01):
+        species_keys = np.asarray(species_keys, dtype=np.int64)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        self.cell_deg = cell_deg
+        if len(lats):
+            self.lat_min, self.lat_max = float(lats.min()), float(lats.max())
+            self.lon_min, self.lon_max = float(lons.min()), float(lons.max())
+        else:
+            self.lat_min = self.lat_max = self.lon_min = self.lon_max = 0.0
+        self.bounds = None # (lat_min, lat_max, lon_min, lon_max) covered by the source query
+        self.dense = [] # boxes inside bounds that were not fetched (see GBIFIO.fetch_occurrences)
+
+        self.n_rows = int((self.lat_max - self.lat_min) // cell_deg) + 1
+        self.n_cols = int((self.lon_max - self.lon_min) // cell_deg) + 1
+
+        # Sort points by cell id so each grid row is one contiguous slice
+        cells = self._cell_ids(lats, lons)
+        order = np.argsort(cells, kind='stable')
+        self.cells = cells[order]
+        self.species_keys = species_keys[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.redlist = None if redlist is None else np.asarray(redlist, dtype=np.uint8)[order]
+        self._species_redlist = None
+
+    def __len__(self) -> int:
+        return len(self.species_keys)
+
+    def _rows_cols(self, lats, lons):
+        rows = np.clip(((lats - self.lat_min) // self.cell_deg).astype(np.int64), 0, self.n_rows - 1)
+        cols = np.clip(((lons - self.lon_min) // self.cell_deg).astype(np.int64), 0, self.n_cols - 1)
+        return rows, cols
+
+    def _cell_ids(self, lats, lons):
+        rows, cols = self._rows_cols(lats, lons)
+        return rows * self.n_cols + cols
+
+    def covers(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> bool:
+        if self.bounds is None:
+            return False
+        b_lat_min, b_lat_max, b_lon_min, b_lon_max = self.bounds
+        if not (b_lat_min <= lat_min and lat_max <= b_lat_max and b_lon_min <= lon_min and lon_max <= b_lon_max):
+            return False
+        return not any(lat_min < d_lat_max and d_lat_min < lat_max and lon_min < d_lon_max and d_lon_min < lon_max
+                       for d_lat_min, d_lat_max, d_lon_min, d_lon_max in self.dense)
+
+    def query_box(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> np.ndarray:
+        """Return indices (into the sorted arrays) of points inside the box."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        (r0, r1), (c0, c1) = self._rows_cols(np.array([lat_min, lat_max]), np.array([lon_min, lon_max]))
+        row_ids = np.arange(r0, r1 + 1) * self.n_cols
+        starts = np.searchsorted(self.cells, row_ids + c0, side='left')
+        ends = np.searchsorted(self.cells, row_ids + c1, side='right')
+        if not (ends > starts).any():
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends) if e > s])
+
+        lats = self.lats[candidates]
+        lons = self.lons[candidates]
+        inside = (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+        return candidates[inside]
+
+    def species_counts(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float):
+        """Unique species keys inside the box, with occurrence counts (descending)."""
+        keys, counts = np.unique(self.species_keys[self.query_box(lat_min, lat_max, lon_min, lon_max)], return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        return keys[order], counts[order]
+
+    def facet_response(self,
+                       lat_min: float,
+                       lat_max: float,
+                       lon_min: float,
+                       lon_max: float,
+                       facet_limit: int = 1000) -> dict:
+        """Answer a geofence query in the same shape as a GBIF speciesKey facet response."""
+        keys, counts = self.species_counts(lat_min, lat_max, lon_min, lon_max)
+        keys, counts = keys[:facet_limit], counts[:facet_limit]
+        return {
+            'count': int(counts.sum()),
+            'results': [],
+            'facets': [{
+                'field': 'SPECIES_KEY',
+                'counts': [{'name': str(k), 'count': int(c)} for k, c in zip(keys, counts)],
+            }],
+        }
+
+    def species_info(self, species_key: int):
+        """Minimal species record with the redlist code seen in the occurrences, for offline use."""
+        if self.redlist is None:
+            return None
+        if self._species_redlist is None:
+            # Per species, prefer any assessed category over NE (REDLIST_CODES ends with DD, NE)
+            order = np.argsort(self.species_keys, kind='stable')
+            keys, first = np.unique(self.species_keys[order], return_index=True)
+            codes = np.minimum.reduceat(self.redlist[order], first)
+            self._species_redlist = dict(zip(keys.tolist(), codes.tolist()))
+        code = self._species_redlist.get(int(species_key))
+        if code is None:
+            return None
+        return {
+            'key': int(species_key),
+            'redlist': {'code': REDLIST_CODES[code]},
+        }
+
+    def save(self, path: str) -> None:
+        """Write the columnar store (.npz) so later runs skip ingestion."""
+        np.savez(path,
+                 species_keys=self.species_keys,
+                 lats=self.lats,
+                 lons=self.lons,
+                 redlist=self.redlist if self.redlist is not None else np.empty(0, dtype=np.uint8),
+                 cell_deg=np.float64(self.cell_deg),
+                 bounds=np.array(self.bounds if self.bounds is not None else [], dtype=np.float64),
+                 dense=np.array(self.dense, dtype=np.float64).reshape(-1, 4))
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            redlist = data['redlist'] if len(data['redlist']) else None
+            index = cls(
+                species_keys=data['species_keys'],
+                lats=data['lats'],
+                lons=data['lons'],
+                redlist=redlist,
+                cell_deg=float(data['cell_deg']),
+                )
+            bounds = data['bounds']
+            index.bounds = tuple(bounds.tolist()) if len(bounds) else None
+            if 'dense' in data:
+                index.dense = [tuple(box) for box in data['dense'].tolist()]
+        return index
+
+    @classmethod
+    def from_export(cls,
+                    path: str,
+                    cell_deg: float = 0.01,
+                    chunksize: int = 1_000_000,
+                    kingdom_key: int = 1): # Animalia, None for every kingdom
+        """Ingest a GBIF occurrence download (Darwin Core Archive .zip or simple CSV/TSV).
+
+        Rows are filtered to `kingdom_key` using the kingdomKey column, or the kingdom
+        name column when there is none; pass kingdom_key=None to keep every row.
+        Raises ValueError if the export has neither column.
+        """
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                with archive.open('occurrence.txt') as stream:
+                    frames = _read_export(stream, sep='\t', chunksize=chunksize, kingdom_key=kingdom_key)
+        else:
+            with open(path, encoding='utf-8') as stream:
+                sep = '\t' if '\t' in stream.readline() else ','
+            frames = _read_export(path, sep=sep, chunksize=chunksize, kingdom_key=kingdom_key)
+
+        keys = np.concatenate([f[0] for f in frames]) if frames else np.empty(0, dtype=np.int64)
+        lats = np.concatenate([f[1] for f in frames]) if frames else np.empty(0)
+        lons = np.concatenate([f[2] for f in frames]) if frames else np.empty(0)
+        redlist = np.concatenate([f[3] for f in frames]) if frames else np.empty(0, dtype=np.uint8)
+
+        index = cls(species_keys=keys, lats=lats, lons=lons, redlist=redlist, cell_deg=cell_deg)
+        index.bounds = (index.lat_min, index.lat_max, index.lon_min, index.lon_max)
+        print(f"Ingested {len(index)} occurrences from: {os.path.basename(path)}")
+        return index
+
+    def batch_richness(self, boxes: np.ndarray) -> np.ndarray:
+        """Species richness for an (N, 4) array of (lat_min, lat_max, lon_min, lon_max) boxes."""
+        return np.array([len(self.species_counts(*box)[0]) for box in np.asarray(boxes, dtype=np.float64)], dtype=np.int64)
+
+
+def _read_export(source, sep: str, chunksize: int, kingdom_key: int) -> list[tuple]:
+    frames = []
+    reader = pd.read_csv(source,
+                         sep=sep,
+                         usecols=lambda c: c in EXPORT_COLUMNS,
+                         chunksize=chunksize,
+                         quoting=3, # GBIF exports are unquoted
+                         on_bad_lines='skip',
+                         low_memory=False)
+    for chunk in reader:
+        if kingdom_key is None:
+            pass
+        elif 'kingdomKey' in chunk.columns:
+            chunk = chunk[chunk['kingdomKey'] == kingdom_key]
+        elif 'kingdom' in chunk.columns:
+            chunk = chunk[chunk['kingdom'] == KINGDOMS[kingdom_key]]
+        else:
+            raise ValueError("Occurrence export has no kingdomKey or kingdom column to filter on; "
+                             "pass kingdom_key=None to ingest every kingdom")
+        chunk = chunk.dropna(subset=['speciesKey', 'decimalLatitude', 'decimalLongitude'])
+        if 'iucnRedListCategory' in chunk.columns:
+            redlist = encode_redlist(chunk['iucnRedListCategory'].fillna('NE'))
+        else:
+            redlist = np.full(len(chunk), REDLIST_CODES.index('NE'), dtype=np.uint8)
+        frames.append((
+            chunk['speciesKey'].to_numpy(dtype=np.int64),
+            chunk['decimalLatitude'].to_numpy(dtype=np.float64),
+            chunk['decimalLongitude'].to_numpy(dtype=np.float64),
+            redlist,
+        ))
+    return frames
+
+
+def bbox_from_tiles(tile_names: list[str], margin_km: float = 1.0) -> tuple[float, float, float, float]:
+    """City bounding box (lat_min, lat_max, lon_min, lon_max) from tile_<lat>_<lon> names, padded by margin_km.
+
+    Returns None when no name parses as a tile (e.g. an empty city folder).
+    """
+    lats, lons = [], []
+    for name in tile_names:
+        parts = name.rsplit('.', 1)[0].split('_')
+        try:
+            lat, lon = float(parts[-2]), float(parts[-1])
+        except (IndexError, ValueError):
+            continue
+        lats.append(lat)
+        lons.append(lon)
+    if not lats:
+        return None
+    lats, lons = np.array(lats), np.array(lons)
+
+    lat_pad = margin_km / 111.0
+    lon_pad = margin_km / (111.320 * np.cos(np.deg2rad(np.abs(lats).max())))
+    return (float(lats.min() - lat_pad), float(lats.max() + lat_pad),
+            float(lons.min() - lon_pad), float(lons.max() + lon_pad))
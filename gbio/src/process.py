@@ -1,13 +1,26 @@
 import os
+import json
 import cv2
+import functools
+import threading
+import multiprocessing
 
 import pandas as pd
 import time
 import numpy as np
 
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 import gbio.src.gbif_query as gbq
+import gbio.src.cache as cache
+import gbio.src.occurrences as occ
+import gbio.src.landcover as lcv
+import gbio.src.transforms as tfm
+import gbio.src.manifest as mf
+import gbio.src.metrics as metrics
+import gbio.src.species_matrix as spm
+import gbio.src.triage as trg
 
 sharpness_kernel = np.array([
     [0, -1, 0],
@@ -18,14 +31,58 @@ sharpness_kernel = np.array([
 GAMMA = 1.5
 
 
-g = gbq.GBIFIO(silent=False)
+# Shared GBIFIO, built on first use by gbif() so importing this module (e.g. in render workers) stays cheap
+g = None
+_g_lock = threading.Lock()
+
+def gbif() -> gbq.GBIFIO:
+    global g
+    if g is None:
+        with _g_lock:
+            if g is None:
+                g = gbq.GBIFIO(silent=False)
+    return g
+
+CROP = (150, 225)
+
+@functools.lru_cache(maxsize=None)
+def gamma_lut(gamma: float = GAMMA) -> np.ndarray:
+    """256-entry table equal to np.uint8(255 * (v / 255) ** (1 / gamma)) for every uint8 v."""
+    values = np.arange(256, dtype=np.uint8)
+    return np.uint8(255 * (values / 255) ** (1/gamma))
 
 def apply_filters(img):
-    img_cropped = img[0:150, 0:225]
+    img_cropped = img[0:CROP[0], 0:CROP[1]]
     sharpened = cv2.filter2D(img_cropped, -2, sharpness_kernel)
-    gamma_corrected = np.uint8(255 * (sharpened / 255) ** (1/GAMMA))
+    gamma_corrected = cv2.LUT(sharpened, gamma_lut(GAMMA))
     return gamma_corrected
 
+def sharpen_batch(crops) -> np.ndarray:
+    """Apply sharpness_kernel to N same-shape uint8 images, writing into one (N, H, W, C) array."""
+    out = np.empty((len(crops),) + crops[0].shape, dtype=np.uint8)
+    for i, crop in enumerate(crops):
+        cv2.filter2D(crop, -2, sharpness_kernel, dst=out[i])
+    return out
+
+def apply_lut(batch: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Map every uint8 of a stack through a 256-entry table in place, in one call."""
+    flat = batch.reshape(-1, batch.shape[-2], batch.shape[-1])
+    cv2.LUT(flat, lut, dst=flat)
+    return batch
+
+def apply_filters_batch(imgs) -> np.ndarray:
+    """Crop, sharpen and gamma-correct N tiles at once; bit-identical to apply_filters.
+
+    `imgs` is a list of images or an (N, H, W, 3) uint8 array. Returns (N, 150, 225, 3) uint8.
+    """
+    if len(imgs) == 0: # e.g. every tile of a city skipped or triaged away
+        return np.empty((0,) + CROP + (3,), dtype=np.uint8)
+    crops = [img[0:CROP[0], 0:CROP[1]] for img in imgs]
+    if len({c.shape for c in crops}) != 1:
+        # Ragged crops cannot be stacked; fall back to the per-image path
+        return np.stack([apply_filters(img) for img in imgs])
+    return apply_lut(sharpen_batch(crops), gamma_lut(GAMMA))
+
 def gen_entry(img_name: str,
               variation: int,
               city: str,
@@ -44,66 +101,332 @@ def gen_entry(img_name: str,
 
 
 
-def process_img(img_path: str, 
-                out_path: str,
-                city: str) -> list[dict]:
-    img = cv2.imread(img_path)
-    img = apply_filters(img=img)
+def augment(img) -> list:
+    return [tfm.apply_transform(img, t) for t in tfm.TRANSFORM_IDS]
 
-    rotated_180 = cv2.rotate(img, cv2.ROTATE_180)
-    flip_1 = cv2.flip(img, 1) # Horizontal Flip
-    flip_2 = cv2.flip(img, 0) # Vertical Flip
-    rots = [img, rotated_180, flip_1, flip_2]
+def render_tile(img_path: str,
+                out_path: str,
+                landcover_dir: str = None,
+                virtual: bool = False) -> list[tuple[str, dict]]:
+    """CPU stage: decode, filter, augment and encode one tile.
+
+    Returns (name, extra columns) per variation. With `landcover_dir` the landcover
+    mask and percent are computed from the in-memory arrays in the same pass.
+    With `virtual` only the base tile (and its mask) is written; every variation
+    row points at it through `source_name` and is transformed at read time.
+    """
+    with metrics.timer("decode"):
+        img = cv2.imread(img_path)
+    with metrics.timer("filter"):
+        img = apply_filters(img=img)
 
     f_name = os.path.basename(out_path).replace(".tif", '.jpg')
     d_name = os.path.dirname(out_path)
 
-    entries = []
-
+    if virtual:
+        base_name = f"{tfm.IDENTITY}_{f_name}"
+        with metrics.timer("encode"):
+            cv2.imwrite(os.path.join(d_name, base_name), img)
+
+        # Vegetation fraction is invariant under the flips/rotation, so compute it once
+        shared = {"source_name": base_name}
+        if landcover_dir is not None:
+            with metrics.timer("landcover"):
+                mask, lc_percent = lcv.compute_landcover(img)
+                lc_name = lcv.landcover_name(base_name)
+                cv2.imwrite(os.path.join(landcover_dir, lc_name), mask)
+            shared.update({
+                "landcover_percent": float(lc_percent),
+                "landcover_object": lc_name,
+            })
+        return [(f"{t}_{f_name}", dict(shared)) for t in tfm.TRANSFORM_IDS]
+
+    with metrics.timer("augment"):
+        rots = augment(img)
+
+    variations = []
+    for i, r in enumerate(rots):
+        iter_name = f"{i}_{f_name}"
+        with metrics.timer("encode"):
+            cv2.imwrite(os.path.join(d_name, iter_name), r)
+
+        extra = {}
+        if landcover_dir is not None:
+            with metrics.timer("landcover"):
+                mask, lc_percent = lcv.compute_landcover(r)
+                lc_name = lcv.landcover_name(iter_name)
+                cv2.imwrite(os.path.join(landcover_dir, lc_name), mask)
+            extra = {
+                "landcover_percent": float(lc_percent),
+                "landcover_object": lc_name,
+            }
+        variations.append((iter_name, extra))
+    return variations
+
+def species_info(tile_species: dict[str, list[tuple[int, int]]]) -> dict[int, tuple[str, str]]:
+    """Names and redlist codes of every species in `tile_species`, from the species already resolved."""
+    keys = {key for pairs in tile_species.values() for key, _ in pairs}
+    return spm.species_table(sorted(keys), gbif().get_species_name)
+
+def query_tile(out_path: str,
+               concurrent: bool = False,
+               species_out: dict = None,
+               dropped: dict = None) -> dict:
+    """I/O stage: geofence query and species resolution for one tile.
+
+    When `species_out` is given, the tile's (species key, count) pairs are stored
+    in it under the tile stem (tile_<lat>_<lon>). When `dropped` is given, tiles
+    that produce no data are recorded in it with the reason.
+    """
     global g
 
+    f_name = os.path.basename(out_path).replace(".tif", '.jpg')
     name, lon, lat = f_name.split('_')
     lat = lat.split('.jpg')[0]
 
+    reason = None
     try:
-        gbif_data = g.request_by_geofence(coord=(float(lon), float(lat)))
-        gbif_data = g.process_output(gbif_data)
+        with metrics.timer("geofence_query"):
+            gbif_data = gbif().request_by_geofence(coord=(float(lon), float(lat)))
+        if gbif_data is None:
+            reason = f"geofence_{gbif().last_failure() or 'failed'}"
+        with metrics.timer("species_lookup"):
+            gbif_data, species = gbif().process_output(gbif_data, concurrent=concurrent, return_species=True)
+        if gbif_data is not None and species_out is not None:
+            species_out[f_name.replace('.jpg', '')] = species
     except Exception as e:
         print(f"Error querying GBIF for image {f_name} at coords {(lon, lat)}: {e}")
         gbif_data = None
+        # Reasons end up in counter names and drop reports, so keep them to fixed codes
+        if isinstance(e, gbq.GBIFRequestError):
+            reason = e.reason
+        elif isinstance(e, cache.OfflineCacheMiss):
+            reason = "offline_cache_miss"
+        else:
+            reason = f"error_{type(e).__name__}"
 
     if gbif_data is None:
-        print(f"No GBIF data found for image: {f_name} at coords: {(lon, lat)}")
-        return []
-
-    for i, r in enumerate(rots):
-        iter_name = f"{i}_{f_name}"
-        cv2.imwrite(os.path.join(d_name, iter_name), r)
+        metrics.count("tiles_dropped")
+        metrics.count(f"tiles_dropped_{reason}")
+        if dropped is not None:
+            dropped[f_name.replace('.jpg', '')] = reason
+        print(f"No GBIF data found for image: {f_name} at coords: {(lon, lat)} ({reason})")
+    return gbif_data
+
+def build_entries(variations: list[tuple[str, dict]],
+                  city: str,
+                  gbif_data: dict) -> list[dict]:
+    entries = []
+    for i, (iter_name, extra) in enumerate(variations):
         e = gen_entry(
             img_name=iter_name, 
             variation=i,
             city=city,
         )
-        if gbif_data is not None:
-            e.update(gbif_data)
+        e.update(gbif_data)
+        e.update(extra)
         entries.append(e)
     return entries
+
+def process_img(img_path: str, 
+                out_path: str,
+                city: str,
+                concurrent: bool = False,
+                landcover_dir: str = None,
+                virtual: bool = False,
+                species_out: dict = None,
+                dropped: dict = None) -> list[dict]:
+    gbif_data = query_tile(out_path, concurrent=concurrent, species_out=species_out, dropped=dropped)
+    if gbif_data is None:
+        return []
+
+    variations = render_tile(img_path, out_path, landcover_dir=landcover_dir, virtual=virtual)
+    return build_entries(variations, city, gbif_data)
+
+def _render_tile_worker(img_path: str,
+                        out_path: str,
+                        landcover_dir: str = None,
+                        virtual: bool = False,
+                        metrics_enabled: bool = True):
+    """render_tile in a pool worker, returning its metrics so the parent can merge them."""
+    metrics.METRICS.enabled = metrics_enabled
+    metrics.METRICS.reset()
+    variations = render_tile(img_path, out_path, landcover_dir=landcover_dir, virtual=virtual)
+    return variations, metrics.METRICS.snapshot() if metrics_enabled else None
+
+def process_tiles_parallel(jobs: list[tuple[str, str]],
+                           city: str,
+                           workers: int,
+                           io_workers: int = None,
+                           max_pending: int = None,
+                           concurrent: bool = False,
+                           landcover_dir: str = None,
+                           virtual: bool = False,
+                           species_out: dict = None,
+                           dropped: dict = None) -> list[dict]:
+    """Pipeline GBIF lookups (thread pool) into image work (process pool).
+
+    At most `max_pending` tiles are in flight across both stages, and rows are
+    returned in the order of `jobs` regardless of completion order. Render workers
+    are spawned, not forked: a fork while an IO thread holds a lock (metrics, species
+    store, HTTP session) would leave the child waiting on it forever.
+    """
+    io_workers = io_workers or 4 * workers
+    max_pending = max_pending or 2 * (workers + io_workers)
+
+    results: list = [None] * len(jobs)
+    gbif_futures = {}
+    render_futures = {}
+    pending_jobs = iter(enumerate(jobs))
+
+    with ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+         ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as cpu_pool, \
+         tqdm(total=len(jobs)) as bar:
+
+        def fill():
+            while len(gbif_futures) + len(render_futures) < max_pending:
+                nxt = next(pending_jobs, None)
+                if nxt is None:
+                    return
+                i, (_, out_path) = nxt
+                gbif_futures[io_pool.submit(query_tile, out_path, concurrent, species_out, dropped)] = i
+
+        fill()
+        while gbif_futures or render_futures:
+            done, _ = wait(list(gbif_futures) + list(render_futures), return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut in gbif_futures:
+                    i = gbif_futures.pop(fut)
+                    gbif_data = fut.result()
+                    if gbif_data is None:
+                        results[i] = []
+                        bar.update(1)
+                        continue
+                    img_path, out_path = jobs[i]
+                    render_futures[cpu_pool.submit(_render_tile_worker, img_path, out_path, landcover_dir, virtual,
+                                                   metrics.METRICS.enabled)] = (i, gbif_data)
+                else:
+                    i, gbif_data = render_futures.pop(fut)
+                    variations, snapshot = fut.result()
+                    metrics.METRICS.merge(snapshot)
+                    results[i] = build_entries(variations, city, gbif_data)
+                    bar.update(1)
+            gbif().species_cache.commit()
+            fill()
+
+    entries = []
+    for r in results:
+        entries.extend(r)
+    return entries
     
 
 
 def create_df(output_path: str, 
               data: list[dict]) -> None:
-    df = pd.DataFrame(data=data)
-    df.index.name = "id"
-    df.to_csv(output_path)
+    with metrics.timer("csv_write"):
+        df = pd.DataFrame(data=data)
+        df.index.name = "id"
+        df.to_csv(output_path)
 
     print(f"Sucessfully created df with cols: {df.columns}, and size: {df.shape}.")
 
+def build_params(landcover: bool, virtual: bool) -> dict:
+    """Everything besides the raw tile bytes that changes a tile's output rows."""
+    return {
+        "gamma": GAMMA,
+        "kernel": sharpness_kernel.tolist(),
+        "crop": list(CROP),
+        "landcover": landcover,
+        "landcover_threshold": lcv.GREEN_THRESHOLD if landcover else None,
+        "virtual": virtual,
+        "transforms": tfm.TRANSFORM_IDS,
+    }
+
+def raw_name(full_name: str) -> str:
+    """Raw tile file name a row was built from, e.g. 2_tile_<lat>_<lon>.jpg -> tile_<lat>_<lon>.tif."""
+    return full_name.split('_', 1)[1].replace('.jpg', '.tif')
+
+def table_rows(df_path: str) -> dict[str, list[str]]:
+    """Row names per raw tile in an existing city table, or None if there is no table."""
+    if not os.path.exists(df_path):
+        return None
+    names = pd.read_csv(df_path, usecols=['full_name'])['full_name']
+    rows = {}
+    for full_name in names:
+        rows.setdefault(raw_name(full_name), []).append(full_name)
+    return rows
+
+def merge_entries(df_path: str,
+                  entries: list[dict],
+                  manifest: dict,
+                  hashes: dict[str, str],
+                  rebuilt: set[str]) -> list[dict]:
+    """Merge freshly built rows into the existing city table and update the manifest in place.
+
+    Rows of rebuilt or removed tiles are replaced; rows are ordered by raw tile name
+    and variation so the result does not depend on which tiles were rebuilt.
+    """
+    rows = []
+    if os.path.exists(df_path):
+        old = pd.read_csv(df_path, index_col="id", float_precision="round_trip")
+        keep = old['full_name'].map(raw_name)
+        old = old[keep.isin(hashes) & ~keep.isin(rebuilt)]
+        rows = old.to_dict(orient='records')
+
+    new_by_tile = {}
+    for e in entries:
+        new_by_tile.setdefault(raw_name(e['full_name']), []).append(e['full_name'])
+    rows.extend(entries)
+
+    tiles = manifest.setdefault('tiles', {})
+    for name in list(tiles):
+        if name not in hashes or name in rebuilt:
+            del tiles[name]
+    for name, full_names in new_by_tile.items():
+        # Tiles that produced no rows (e.g. failed GBIF lookups) stay out of the manifest and are retried
+        tiles[name] = {'hash': hashes[name], 'rows': full_names}
+
+    rows.sort(key=lambda r: (raw_name(r['full_name']), int(r['variation'])))
+    return rows
+
+def save_dropped(csv_path: str, city: str, dropped: dict) -> None:
+    """Write <city>.dropped.json ({tile stem: reason}) for tiles left out of the city table, or clear it."""
+    dropped_path = os.path.join(csv_path, f"{city}.dropped.json")
+    if not dropped:
+        if os.path.exists(dropped_path):
+            os.remove(dropped_path)
+        return
+    with open(dropped_path, 'w') as f:
+        json.dump(dict(sorted(dropped.items())), f, indent=2)
+    reasons = pd.Series(dropped).value_counts().to_dict()
+    print(f"Dropped {len(dropped)} tiles: {reasons}")
+
 def process_sats(input_path_raw: str, 
                  output_path: str, 
                  csv_path: str,
                  override: bool = False,
-                 skip: list[str] = None) -> None:
+                 skip: list[str] = None,
+                 concurrent: bool = False,
+                 prefetch: bool = False,
+                 workers: int = 1,
+                 landcover_path: str = None,
+                 virtual: bool = False,
+                 incremental: bool = False,
+                 report_path: str = None,
+                 triage: bool = False,
+                 triage_thresholds: dict = None) -> None:
+    """Build the per-city CSVs from raw tiles.
+
+    With `landcover_path` the landcover masks and columns are produced in the
+    same pass, replacing a separate landcover.process_sats run. With `virtual`
+    only base tiles are materialized (see render_tile). With `incremental` a
+    per-city manifest records input hashes and build parameters; only new or
+    changed tiles are recomputed and their rows merged into the existing CSV.
+    With `report_path` a metrics run report is written to <report_path>.json/.prom.
+    With `triage` blank, nodata-padded, cloudy or unreadable tiles are scored from
+    thumbnails up front and skipped (see triage.py); they are listed in
+    <city>.triage.json and the drop report.
+    """
     if skip is None:
         skip = []
     
@@ -124,31 +447,103 @@ def process_sats(input_path_raw: str,
         save_dir: str = os.path.join(output_path, city)
         os.makedirs(save_dir, exist_ok=True)
         entries = []
-        
-        for img in tqdm(imgs):
-            img_path: str = os.path.join(dir_path, img)
-            out_path: str = os.path.join(save_dir, img)
-
-            if not override and os.path.exists(out_path):
-                print(f"Image already processed: {img}")
-                continue
-
 
-            e_new: list[dict] = process_img(img_path=img_path, 
-                        out_path=out_path,
-                        city=city)
-            entries.extend(e_new)
-
-            g.cache.save_pickle(g.species_cache, pickle_name="species_cache")
-        
+        landcover_dir = None
+        if landcover_path is not None:
+            landcover_dir = os.path.join(landcover_path, city)
+            os.makedirs(landcover_dir, exist_ok=True)
+
+        if prefetch:
+            # One paged city-wide occurrence query instead of one per tile
+            bbox = occ.bbox_from_tiles(imgs, margin_km=1.0)
+            if bbox is not None:
+                gbif().prefetch_occurrences(bbox)
+            else:
+                print(f"No tiles to prefetch occurrences for in: {city}")
+
+        species_out = {}
+        dropped = {}
+        jobs = []
         df_path: str = os.path.join(csv_path, f"{city}.csv")
+        if incremental:
+            params = build_params(landcover=landcover_path is not None, virtual=virtual)
+            manifest_file = mf.manifest_path(csv_path, city)
+            manifest = mf.load_manifest(manifest_file)
+            hashes = {img: mf.file_hash(os.path.join(dir_path, img)) for img in imgs}
+            stale = set(hashes) if override else set(mf.stale_tiles(manifest, params, hashes, table_rows(df_path)))
+            print(f"{len(stale)} of {len(imgs)} tiles need rebuilding")
+            for img in imgs:
+                if img in stale:
+                    jobs.append((os.path.join(dir_path, img), os.path.join(save_dir, img)))
+        else:
+            for img in imgs:
+                img_path: str = os.path.join(dir_path, img)
+                out_path: str = os.path.join(save_dir, img)
+
+                if not override and os.path.exists(out_path):
+                    print(f"Image already processed: {img}")
+                    continue
+                jobs.append((img_path, out_path))
+
+        if triage and jobs:
+            rejected = trg.triage([img_path for img_path, _ in jobs], thresholds=triage_thresholds)
+            trg.save_report(trg.report_path(csv_path, city), rejected, len(jobs), thresholds=triage_thresholds)
+            jobs = [(img_path, out_path) for img_path, out_path in jobs if os.path.basename(img_path) not in rejected]
+            for name, entry in rejected.items():
+                dropped[name.replace('.tif', '')] = f"triage_{entry['reason']}"
+
+        if workers > 1:
+            entries = process_tiles_parallel(jobs, 
+                        city=city,
+                        workers=workers,
+                        concurrent=concurrent,
+                        landcover_dir=landcover_dir,
+                        virtual=virtual,
+                        species_out=species_out,
+                        dropped=dropped)
+        else:
+            for img_path, out_path in tqdm(jobs):
+                e_new: list[dict] = process_img(img_path=img_path, 
+                            out_path=out_path,
+                            city=city,
+                            concurrent=concurrent,
+                            landcover_dir=landcover_dir,
+                            virtual=virtual,
+                            species_out=species_out,
+                            dropped=dropped)
+                entries.extend(e_new)
+
+                gbif().species_cache.commit()
+
+        if incremental:
+            entries = merge_entries(df_path, entries, manifest, hashes, stale)
+            manifest['params'] = mf.params_hash(params)
         create_df(df_path, entries)
+        # Tile x species counts (with species names and redlist codes), so new aggregates do not need GBIF again
+        keep = {name.replace('.tif', '') for name in hashes if name not in stale} if incremental else None
+        spm.save_city_species(spm.species_path(csv_path, city), species_out, keep=keep,
+                              species_info=species_info(species_out))
+
+        if prefetch:
+            gbif().occurrence_index = None
+        if incremental:
+            mf.save_manifest(manifest_file, manifest)
+        save_dropped(csv_path, city, dropped)
+
+    if report_path is not None:
+        metrics.METRICS.write_report(report_path)
 
 
 
 
 def combine_csvs(input_path: str, 
-                 output_file: str) -> None:
+                 output_file: str,
+                 format: str = "csv") -> None:
+    if format == "parquet":
+        return combine_parquet(input_path, output_file)
+    if format != "csv":
+        raise ValueError(f"Unknown output format: {format}")
+
     files = os.listdir(input_path)
     all_dfs = []
     for f in files:
@@ -159,3 +554,65 @@ def combine_csvs(input_path: str,
     combined_df.index.name = "id"
     combined_df.to_csv(output_file)
     print(f"Combined CSV saved to {output_file} with shape {combined_df.shape}.")
+
+COLUMN_TYPES = {
+    "id": "int64",
+    "full_name": "string",
+    "variation": "uint8",
+    "longitude": "float64",
+    "latitude": "float64",
+    "species_richness": "uint16",
+    **{f"redlist_{c}": "uint16" for c in ['EX', 'EW', 'CR', 'EN', 'VU', 'NT', 'LC', 'DD', 'NE']},
+    "source_name": "string",
+    "landcover_percent": "float32",
+    "landcover_object": "string",
+}
+
+def _arrow_schema(columns: list[str]):
+    import pyarrow as pa
+
+    return pa.schema([(c, pa.from_numpy_dtype(np.dtype(COLUMN_TYPES[c])) if COLUMN_TYPES[c] != "string" else pa.string())
+                      for c in columns if c in COLUMN_TYPES])
+
+def combine_parquet(input_path: str,
+                    output_dir: str) -> None:
+    """Write the per-city CSVs as a typed Parquet dataset partitioned by city (city=<name>/).
+
+    Cities are appended one at a time, so the combined frame is never held in memory.
+    `id` continues across cities exactly as in the combined CSV.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+
+    os.makedirs(output_dir, exist_ok=True)
+    offset = 0
+    for f in os.listdir(input_path):
+        if not f.endswith('.csv'):
+            continue
+        df = pd.read_csv(os.path.join(input_path, f), index_col=False, float_precision="round_trip").drop(labels="id", axis=1)
+        df.insert(0, "id", np.arange(offset, offset + len(df), dtype=np.int64))
+        offset += len(df)
+
+        for city, city_df in df.groupby("city", sort=False):
+            city_df = city_df.drop(columns="city")
+            table = pa.Table.from_pandas(city_df, schema=_arrow_schema(list(city_df.columns)), preserve_index=False)
+            city_dir = os.path.join(output_dir, f"city={city}")
+            os.makedirs(city_dir, exist_ok=True)
+            pq.write_table(table, os.path.join(city_dir, "part-0.parquet"), compression="zstd")
+            print(f"Wrote {table.num_rows} rows for {city} to {city_dir}")
+
+    print(f"Combined Parquet dataset saved to {output_dir} with {offset} rows.")
+
+def read_combined(path: str,
+                  columns: list[str] = None,
+                  cities: list[str] = None) -> pd.DataFrame:
+    """Read a combined Parquet dataset with column projection and city predicate pushdown."""
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet", partitioning=ds.partitioning(flavor="hive", dictionaries="infer"))
+    flt = ds.field("city").isin(cities) if cities is not None else None
+    table = dataset.to_table(columns=columns, filter=flt)
+    return table.to_pandas().set_index("id") if "id" in table.column_names else table.to_pandas()
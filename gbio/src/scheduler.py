@@ -0,0 +1,157 @@
+import time
+import random
+import threading
+
+import requests
+
+import gbio.src.metrics as metrics
+
+# Statuses worth retrying; they also signal congestion to the AIMD controller
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RequestScheduler():
+    """Shared gate for all GBIF HTTP traffic.
+
+    Requests take a token from a token bucket (`rate` per second, up to `burst` at
+    once) and a slot under an AIMD concurrency limit: the limit grows by about one
+    per window of fast, successful requests and is multiplied by `decrease` on 429s,
+    5xx, timeouts or latency above `target_latency` (at most once per
+    `target_latency`, so one burst of failures counts as one congestion event).
+    Failed requests are retried with full-jitter exponential backoff, honouring
+    Retry-After on 429.
+    """
+    def __init__(self,
+                 rate: float = 50.0,
+                 burst: int = None,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = 16,
+                 initial_concurrency: int = 4,
+                 decrease: float = 0.5,
+                 target_latency: float = 2.0,
+                 timeout: tuple[float, float] = (5.0, 30.0), # (connect, read) seconds
+                 max_retries: int = 5,
+                 backoff_base: float = 0.5,
+                 backoff_cap: float = 30.0):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, int(rate)))
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.timeout = tuple(timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._last_decrease = 0.0
+
+    @classmethod
+    def from_config(cls, config: dict = None, **overrides):
+        """Build from the `request-limits` section of config.yml (dashed keys), plus overrides."""
+        kwargs = {k.replace('-', '_'): v for k, v in (config or {}).items()}
+        kwargs.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**kwargs)
+
+    # ------------------------------
+    # Token bucket and AIMD limit
+    # ------------------------------
+
+    def _take_token(self) -> None:
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def _acquire_slot(self) -> None:
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def _release_slot(self, congested: bool, latency: float) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if congested or latency > self.target_latency:
+                if now - self._last_decrease >= self.target_latency:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease)
+                    self._last_decrease = now
+                    metrics.count("scheduler_decrease")
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (e.g. on Retry-After)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _backoff(self, attempt: int, res) -> float:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        retry_after = res.headers.get('Retry-After') if res is not None else None
+        if retry_after is not None:
+            try:
+                wait = min(float(retry_after), self.backoff_cap)
+            except ValueError: # HTTP-date form, not worth parsing
+                wait = None
+            if wait is not None:
+                self.pause(wait)
+                delay = max(delay, wait)
+        return delay
+
+    # ------------------------------
+    # Sending
+    # ------------------------------
+
+    def send(self, fn) -> tuple[requests.Response, str]:
+        """Run fn(timeout) -> requests.Response under the limits, retrying transient failures.
+
+        Returns (response, None) on a 200, otherwise (last response or None, reason)
+        with reason such as 'http_404', 'http_429', 'timeout' or 'connection_error'.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._take_token()
+            self._acquire_slot()
+            res = None
+            start = time.perf_counter()
+            try:
+                res = fn(self.timeout)
+                reason = None if res.status_code == 200 else f"http_{res.status_code}"
+            except requests.exceptions.Timeout:
+                reason = "timeout"
+            except requests.exceptions.ConnectionError:
+                reason = "connection_error"
+            except requests.exceptions.RequestException as e:
+                reason = type(e).__name__
+            except BaseException:
+                self._release_slot(congested=False, latency=0.0)
+                raise
+            latency = time.perf_counter() - start
+
+            retryable = reason in ("timeout", "connection_error") or (res is not None and res.status_code in RETRY_STATUS)
+            self._release_slot(congested=retryable, latency=latency)
+            metrics.observe("http_request_seconds", latency)
+            if res is not None:
+                metrics.count(f"http_status_{res.status_code}")
+            else:
+                metrics.count("http_errors")
+
+            if reason is None or not retryable or attempt == self.max_retries:
+                return res, reason
+            metrics.count("http_retries")
+            time.sleep(self._backoff(attempt, res))
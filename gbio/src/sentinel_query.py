@@ -69,26 +69,27 @@ def monitor_tasks(tasks, wait_sec=10):
 # Example usage
 # ------------------------------
 
-ee.Authenticate()
-ee.Initialize(project="geofenced-biodiversity-project")
+if __name__ == "__main__":
+    ee.Authenticate()
+    ee.Initialize(project="geofenced-biodiversity-project")
 
-# List of center coordinates (lon, lat)
-centers = [
-    (51.50594342127512, -0.12428852168536396),
-]
+    # List of center coordinates (lon, lat)
+    centers = [
+        (51.50594342127512, -0.12428852168536396),
+    ]
 
-w_km = 1.0        # tile size
-tiles_per_side = 9
+    w_km = 1.0        # tile size
+    tiles_per_side = 9
 
-tasks = []
-for lon_center, lat_center in centers:
-    grid = create_grid(lon_center, lat_center, w_km, tiles_per_side)
-    for lon, lat in grid:
-        task = export_tile(lon, lat, w_km, folder='GEE_London', prefix='tile')
-        tasks.append(task)
+    tasks = []
+    for lon_center, lat_center in centers:
+        grid = create_grid(lon_center, lat_center, w_km, tiles_per_side)
+        for lon, lat in grid:
+            task = export_tile(lon, lat, w_km, folder='GEE_London', prefix='tile')
+            tasks.append(task)
 
-# tile 1 etc
-# csv tile_name, lon, lat, city
-columns: list = ["tile_name", "lon", "lat", "city"]
+    # tile 1 etc
+    # csv tile_name, lon, lat, city
+    columns: list = ["tile_name", "lon", "lat", "city"]
 
-monitor_tasks(tasks)
+    monitor_tasks(tasks)
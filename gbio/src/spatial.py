@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def parse_tile_name(full_name: str) -> tuple[str, float, float]:
+    """(stem, lat, lon) from a row name such as 2_tile_<lat>_<lon>.jpg.
+
+    Tile names always carry latitude first (see workingquery.export_tile). The
+    `longitude`/`latitude` columns written by process.gen_entry are swapped
+    relative to this, so coordinates are taken from the name instead.
+    """
+    stem = full_name.split('_', 1)[1].rsplit('.', 1)[0]
+    _, lat, lon = stem.split('_')
+    return stem, float(lat), float(lon)
+
+
+class TileIndex:
+    """Spatial index over the tiles of a tile table (e.g. combined.csv).
+
+    Each city's tiles sit on a regular create_grid lattice, so point lookups,
+    bounding boxes and neighbours are answered by hashing into that lattice. Points
+    off every lattice fall back to nearest-tile search on a KD-tree (scipy if
+    available, otherwise vectorized NumPy) over 3D unit-sphere coordinates, so
+    distances stay exact across cities at any latitude.
+    """
+    def __init__(self, df: pd.DataFrame):
+        ids = df.index.to_numpy() if df.index.name == "id" else np.arange(len(df))
+        parsed = [parse_tile_name(n) for n in df['full_name']]
+        rows = pd.DataFrame({
+            'id': ids,
+            'city': df['city'].to_numpy(),
+            'stem': [p[0] for p in parsed],
+            'lat': [p[1] for p in parsed],
+            'lon': [p[2] for p in parsed],
+        })
+        grouped = rows.groupby(['city', 'stem'], sort=False)
+        self.tiles = grouped.agg(lat=('lat', 'first'), lon=('lon', 'first'), ids=('id', list)).reset_index()
+        self.lats = self.tiles['lat'].to_numpy(dtype=np.float64)
+        self.lons = self.tiles['lon'].to_numpy(dtype=np.float64)
+
+        self.lattices = {}
+        for city, idx in self.tiles.groupby('city', sort=False).indices.items():
+            self.lattices[city] = self._build_lattice(idx)
+
+        self._tree = None
+
+    @classmethod
+    def from_csv(cls, csv_path: str):
+        return cls(pd.read_csv(csv_path, index_col="id", float_precision="round_trip"))
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    # ------------------------------
+    # Lattice hashing
+    # ------------------------------
+
+    @staticmethod
+    def _step(values: np.ndarray) -> float:
+        diffs = np.diff(np.unique(values))
+        return float(np.median(diffs)) if len(diffs) else 1.0
+
+    def _build_lattice(self, idx: np.ndarray) -> dict:
+        lats, lons = self.lats[idx], self.lons[idx]
+        lat_step, lon_step = self._step(lats), self._step(lons)
+        lat0, lon0 = lats.min(), lons.min()
+        i = np.rint((lats - lat0) / lat_step).astype(np.int64)
+        j = np.rint((lons - lon0) / lon_step).astype(np.int64)
+        grid = np.full((i.max() + 1, j.max() + 1), -1, dtype=np.int64)
+        grid[i, j] = idx
+        return {'lat0': lat0, 'lon0': lon0, 'lat_step': lat_step, 'lon_step': lon_step, 'grid': grid, 'i': i, 'j': j}
+
+    def _cells(self, lattice: dict, lats: np.ndarray, lons: np.ndarray):
+        i = np.rint((lats - lattice['lat0']) / lattice['lat_step']).astype(np.int64)
+        j = np.rint((lons - lattice['lon0']) / lattice['lon_step']).astype(np.int64)
+        return i, j
+
+    def locate(self, lats, lons, fallback_km: float = None) -> np.ndarray:
+        """Tile index (row of self.tiles) containing each point, -1 if none.
+
+        Points outside every lattice are matched to the nearest tile center when it
+        is within `fallback_km`; pass None to disable the fallback.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        out = np.full(lats.shape, -1, dtype=np.int64)
+        for lattice in self.lattices.values():
+            todo = out < 0
+            if not todo.any():
+                break
+            i, j = self._cells(lattice, lats[todo], lons[todo])
+            grid = lattice['grid']
+            inside = (i >= 0) & (i < grid.shape[0]) & (j >= 0) & (j < grid.shape[1])
+            found = np.full(i.shape, -1, dtype=np.int64)
+            found[inside] = grid[i[inside], j[inside]]
+            out[todo] = found
+
+        if fallback_km is not None and (out < 0).any():
+            missing = np.nonzero(out < 0)[0]
+            dist, nearest = self.nearest(lats[missing], lons[missing], k=1)
+            ok = dist[:, 0] <= fallback_km
+            out[missing[ok]] = nearest[ok, 0]
+        return out
+
+    def neighbours(self, tile: int, radius: int = 1) -> np.ndarray:
+        """Tiles within `radius` lattice steps of a tile (excluding itself), same city."""
+        lattice = self.lattices[self.tiles.at[tile, 'city']]
+        i, j = self._cells(lattice, self.lats[tile:tile + 1], self.lons[tile:tile + 1])
+        grid = lattice['grid']
+        block = grid[max(i[0] - radius, 0):i[0] + radius + 1, max(j[0] - radius, 0):j[0] + radius + 1].ravel()
+        return block[(block >= 0) & (block != tile)]
+
+    def adjacency(self, radius: int = 1) -> list[np.ndarray]:
+        """Neighbour lists for every tile."""
+        return [self.neighbours(t, radius=radius) for t in range(len(self))]
+
+    # ------------------------------
+    # Range and nearest-neighbour queries
+    # ------------------------------
+
+    def bbox(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> np.ndarray:
+        """Tiles whose centers fall inside the box."""
+        inside = (self.lats >= lat_min) & (self.lats <= lat_max) & (self.lons >= lon_min) & (self.lons <= lon_max)
+        return np.nonzero(inside)[0]
+
+    @staticmethod
+    def _xyz(lats, lons) -> np.ndarray:
+        lat, lon = np.deg2rad(np.asarray(lats, dtype=np.float64)), np.deg2rad(np.asarray(lons, dtype=np.float64))
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    @staticmethod
+    def _chord_to_km(chord: np.ndarray) -> np.ndarray:
+        # Great-circle distance for a chord between points on the unit sphere
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+    def nearest(self, lats, lons, k: int = 1, chunk: int = 4096) -> tuple[np.ndarray, np.ndarray]:
+        """Great-circle distances (km) and indices of the k nearest tile centers, each shaped (M, k).
+
+        Chord length grows monotonically with great-circle distance, so the k
+        nearest by chord are the k nearest on the sphere.
+        """
+        points = self._xyz(np.atleast_1d(lats), np.atleast_1d(lons))
+        k = min(k, len(self))
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            cKDTree = None
+
+        if cKDTree is not None:
+            if self._tree is None:
+                self._tree = cKDTree(self._xyz(self.lats, self.lons))
+            dist, idx = self._tree.query(points, k=k)
+            return self._chord_to_km(dist.reshape(len(points), k)), idx.reshape(len(points), k)
+
+        centers = self._xyz(self.lats, self.lons)
+        dists = np.empty((len(points), k))
+        idxs = np.empty((len(points), k), dtype=np.int64)
+        for start in range(0, len(points), chunk):
+            block = points[start:start + chunk]
+            d = np.sqrt(((block[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2))
+            part = np.argpartition(d, k - 1, axis=1)[:, :k]
+            order = np.take_along_axis(d, part, axis=1).argsort(axis=1)
+            idxs[start:start + chunk] = np.take_along_axis(part, order, axis=1)
+            dists[start:start + chunk] = np.take_along_axis(d, idxs[start:start + chunk], axis=1)
+        return self._chord_to_km(dists), idxs
+
+    def rows(self, tiles) -> list[int]:
+        """Tile table ids (all variations) of the given tiles."""
+        ids = []
+        for t in np.atleast_1d(tiles):
+            if t >= 0:
+                ids.extend(self.tiles.at[int(t), 'ids'])
+        return ids
@@ -0,0 +1,206 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def species_path(csv_path: str, city: str) -> str:
+    return os.path.join(csv_path, f"{city}_species.npz")
+
+def _to_csr(tile_species: dict[str, list[tuple[int, int]]]):
+    stems = list(tile_species)
+    keys = np.unique(np.array([k for s in stems for k, _ in tile_species[s]], dtype=np.int64))
+    indptr = np.zeros(len(stems) + 1, dtype=np.int64)
+    indices, data = [], []
+    for row, stem in enumerate(stems):
+        pairs = sorted(tile_species[stem])
+        indices.append(np.searchsorted(keys, np.array([k for k, _ in pairs], dtype=np.int64)))
+        data.append(np.array([c for _, c in pairs], dtype=np.uint32))
+        indptr[row + 1] = indptr[row] + len(pairs)
+    indices = np.concatenate(indices).astype(np.int32) if indices else np.empty(0, dtype=np.int32)
+    data = np.concatenate(data) if data else np.empty(0, dtype=np.uint32)
+    return np.array(stems, dtype=str), keys, indptr, indices, data
+
+def species_table(keys, lookup) -> dict[int, tuple[str, str]]:
+    """{species key: (scientific name, redlist code)} from lookup(key) -> GBIF species record or None."""
+    table = {}
+    for key in keys:
+        info = lookup(int(key))
+        if info is not None:
+            table[int(key)] = (info.get('scientificName', ''), (info.get('redlist') or {}).get('code', 'NE'))
+    return table
+
+def load_species_info(path: str) -> dict[int, tuple[str, str]]:
+    """Species names and redlist codes stored with a city's species file ({} for older files)."""
+    with np.load(path) as f:
+        if 'species_redlist' not in f:
+            return {}
+        keys, names, codes = f['species_keys'], f['species_names'], f['species_redlist']
+    return {int(k): (str(n), str(c)) for k, n, c in zip(keys, names, codes) if c}
+
+def load_city_species(path: str) -> dict[str, list[tuple[int, int]]]:
+    """Per-tile (species key, count) pairs from a city's species file."""
+    with np.load(path) as f:
+        stems, keys, indptr, indices, data = f['stems'], f['species_keys'], f['indptr'], f['indices'], f['data']
+    return {
+        str(stem): list(zip(keys[indices[indptr[r]:indptr[r + 1]]].tolist(), data[indptr[r]:indptr[r + 1]].tolist()))
+        for r, stem in enumerate(stems)
+    }
+
+def save_city_species(path: str,
+                      tile_species: dict[str, list[tuple[int, int]]],
+                      keep: set[str] = None,
+                      species_info: dict[int, tuple[str, str]] = None) -> None:
+    """Write a city's tile x species occurrence counts as CSR arrays.
+
+    With `keep`, tiles of the existing file whose stem is in `keep` are carried over
+    (incremental rebuilds); tiles in `tile_species` always win. `species_info`
+    (see species_table) is stored alongside, so the matrix can be combined later
+    without the species cache.
+    """
+    merged, info = {}, {}
+    if keep is not None and os.path.exists(path):
+        merged = {stem: pairs for stem, pairs in load_city_species(path).items() if stem in keep}
+        info = load_species_info(path)
+    merged.update(tile_species)
+    merged = dict(sorted(merged.items()))
+    info.update(species_info or {})
+
+    stems, keys, indptr, indices, data = _to_csr(merged)
+    names = np.array([info.get(k, ('', ''))[0] for k in keys.tolist()], dtype=str)
+    codes = np.array([info.get(k, ('', ''))[1] for k in keys.tolist()], dtype=str)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez_compressed(tmp_path, stems=stems, species_keys=keys, indptr=indptr, indices=indices, data=data,
+                        species_names=names, species_redlist=codes)
+    os.replace(tmp_path, path)
+
+
+class SpeciesMatrix:
+    """Sparse tile x species occurrence-count matrix (CSR) across cities.
+
+    Rows are tiles identified by (city, stem); columns are a compact integer index
+    into `species`, a table of GBIF species keys, names and redlist codes.
+    """
+    def __init__(self, tiles: pd.DataFrame, species: pd.DataFrame,
+                 indptr: np.ndarray, indices: np.ndarray, data: np.ndarray):
+        self.tiles = tiles.reset_index(drop=True)
+        self.species = species.reset_index(drop=True)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.row_of = {(c, s): i for i, (c, s) in enumerate(zip(self.tiles['city'], self.tiles['stem']))}
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.tiles), len(self.species)
+
+    @classmethod
+    def from_cities(cls, csv_path: str, species_cache=None):
+        """Combine every <city>_species.npz under csv_path.
+
+        Names and redlist codes come from the species files; species_cache (e.g.
+        GBIFIO.species_cache) fills in files written without them. Raises KeyError
+        if a species has no metadata in either.
+        """
+        tiles, per_city, info = [], [], {}
+        for f in sorted(os.listdir(csv_path)):
+            if f.endswith('_species.npz'):
+                city = f[:-len('_species.npz')]
+                tile_species = load_city_species(os.path.join(csv_path, f))
+                tiles.extend((city, stem) for stem in tile_species)
+                per_city.append(tile_species)
+                info.update(load_species_info(os.path.join(csv_path, f)))
+
+        all_pairs = [pairs for tile_species in per_city for pairs in tile_species.values()]
+        keys = np.unique(np.array([k for pairs in all_pairs for k, _ in pairs], dtype=np.int64))
+        indptr = np.zeros(len(all_pairs) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in all_pairs])
+        indices = np.searchsorted(keys, np.array([k for p in all_pairs for k, _ in p], dtype=np.int64)).astype(np.int32)
+        data = np.array([c for p in all_pairs for _, c in p], dtype=np.uint32)
+
+        missing = [k for k in keys.tolist() if k not in info]
+        if missing and species_cache is not None:
+            info.update(species_table(missing, species_cache.get))
+            missing = [k for k in missing if k not in info]
+        if missing:
+            raise KeyError(f"No name or redlist code for {len(missing)} species (e.g. {missing[0]}); "
+                           "rebuild the city tables or pass species_cache")
+        names = [info[k][0] for k in keys.tolist()]
+        codes = [info[k][1] for k in keys.tolist()]
+        species = pd.DataFrame({'species_key': keys, 'name': names, 'redlist': pd.Categorical(codes)})
+        return cls(pd.DataFrame(tiles, columns=['city', 'stem']), species, indptr, indices, data)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path,
+                            city=self.tiles['city'].to_numpy(dtype=str),
+                            stem=self.tiles['stem'].to_numpy(dtype=str),
+                            species_key=self.species['species_key'].to_numpy(),
+                            name=self.species['name'].to_numpy(dtype=str),
+                            redlist=self.species['redlist'].astype(str).to_numpy(dtype=str),
+                            indptr=self.indptr, indices=self.indices, data=self.data)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as f:
+            tiles = pd.DataFrame({'city': f['city'], 'stem': f['stem']})
+            species = pd.DataFrame({'species_key': f['species_key'], 'name': f['name'], 'redlist': pd.Categorical(f['redlist'])})
+            return cls(tiles, species, f['indptr'], f['indices'], f['data'])
+
+    def _row_ids(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.tiles)), np.diff(self.indptr))
+
+    def richness(self, species_mask: np.ndarray = None) -> np.ndarray:
+        """Number of species per tile, optionally restricted to a boolean mask over species."""
+        present = np.ones(len(self.indices), dtype=bool) if species_mask is None else np.asarray(species_mask)[self.indices]
+        return np.bincount(self._row_ids(), weights=present, minlength=len(self.tiles)).astype(np.int64)
+
+    def occurrences(self, species_mask: np.ndarray = None) -> np.ndarray:
+        """Occurrence counts per tile, optionally restricted to a boolean mask over species."""
+        weights = self.data.astype(np.float64)
+        if species_mask is not None:
+            weights = weights * np.asarray(species_mask)[self.indices]
+        return np.bincount(self._row_ids(), weights=weights, minlength=len(self.tiles)).astype(np.int64)
+
+    def redlist_mask(self, codes: list[str]) -> np.ndarray:
+        return self.species['redlist'].isin(codes).to_numpy()
+
+    def neighbourhood_richness(self, index, radius: int = 1, species_mask: np.ndarray = None) -> np.ndarray:
+        """Distinct species over each tile of a spatial.TileIndex plus its neighbours.
+
+        Results follow the index's tile order; tiles without a species record add
+        nothing. With scipy this is (neighbourhood x presence) as a sparse product,
+        counting nonzeros per row; otherwise the same (tile, species) pairs are
+        deduplicated with NumPy.
+        """
+        rows = self.rows_for(index.tiles['city'], index.tiles['stem'])
+        adjacency = index.adjacency(radius=radius)
+        n = len(index)
+        src = np.repeat(np.arange(n), [len(a) + 1 for a in adjacency])
+        dst = np.concatenate([np.append(a, t) for t, a in enumerate(adjacency)]).astype(np.int64) if n else np.empty(0, dtype=np.int64)
+        # Route each neighbourhood member through its matrix row; tiles without one drop out here
+        dst = rows[dst]
+        src, dst = src[dst >= 0], dst[dst >= 0]
+
+        keep = np.ones(len(self.indices), dtype=bool) if species_mask is None else np.asarray(species_mask, dtype=bool)[self.indices]
+        try:
+            import scipy.sparse as sp
+        except ImportError:
+            sp = None
+
+        if sp is not None:
+            neighbourhood = sp.csr_matrix((np.ones(len(src), dtype=np.int32), (src, dst)), shape=(n, len(self.tiles)))
+            presence = sp.csr_matrix((np.ones(keep.sum(), dtype=np.int32), (self._row_ids()[keep], self.indices[keep])),
+                                     shape=self.shape)
+            return (neighbourhood @ presence).getnnz(axis=1).astype(np.int64)
+
+        lengths = np.diff(self.indptr)[dst]
+        starts = np.repeat(self.indptr[dst] - np.cumsum(lengths) + lengths, lengths)
+        entries = starts + np.arange(lengths.sum())
+        tiles = np.repeat(src, lengths)[keep[entries]]
+        cols = self.indices[entries][keep[entries]]
+        pairs = np.unique(tiles * len(self.species) + cols)
+        return np.bincount(pairs // max(len(self.species), 1), minlength=n).astype(np.int64)
+
+    def rows_for(self, cities, stems) -> np.ndarray:
+        """Matrix rows for (city, stem) pairs, -1 where a tile has no species record."""
+        return np.array([self.row_of.get((c, s), -1) for c, s in zip(cities, stems)], dtype=np.int64)
@@ -0,0 +1,73 @@
+import os
+import numpy as np
+
+from gbio.src.workingquery import km_to_deg, create_grid
+
+# ------------------------------
+# Grid geometry (same conventions as workingquery)
+# ------------------------------
+
+def tile_bounds(center_lon: float, center_lat: float, width_km: float):
+    """(lon_min, lat_min, lon_max, lat_max) of a tile, matching workingquery.get_bbox."""
+    lon_offset, lat_offset = km_to_deg(km=width_km/2.0, lat=center_lat)
+    return (center_lon - lon_offset, center_lat - lat_offset,
+            center_lon + lon_offset, center_lat + lat_offset)
+
+def grid_bounds(grid: list[tuple[float, float]], width_km: float):
+    """Union of all tile bounds of a grid, for a single city-wide export."""
+    bounds = np.array([tile_bounds(lon, lat, width_km) for lon, lat in grid])
+    return (float(bounds[:, 0].min()), float(bounds[:, 1].min()),
+            float(bounds[:, 2].max()), float(bounds[:, 3].max()))
+
+def tile_name(center_lon: float, center_lat: float, prefix: str = 'tile') -> str:
+    """File stem used by per-tile exports: <prefix>_<lat>_<lon>."""
+    return f'{prefix}_{center_lat}_{center_lon}'
+
+# ------------------------------
+# Local tiler
+# ------------------------------
+
+def slice_mosaic(mosaic_path: str,
+                 grid: list[tuple[float, float]],
+                 width_km: float,
+                 output_dir: str,
+                 prefix: str = 'tile',
+                 override: bool = False) -> list[str]:
+    """Cut a city mosaic GeoTIFF (EPSG:4326) into one GeoTIFF per grid cell.
+
+    Each tile is read as a window, so only the blocks it covers are decoded, and
+    written as <prefix>_<lat>_<lon>.tif exactly like a per-tile export.
+    """
+    try:
+        import rasterio
+        from rasterio.windows import from_bounds
+    except ImportError as e:
+        raise ImportError("The local tiler requires rasterio: pip install rasterio") from e
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    with rasterio.open(mosaic_path) as src:
+        for lon, lat in grid:
+            out_path = os.path.join(output_dir, f"{tile_name(lon, lat, prefix)}.tif")
+            if not override and os.path.exists(out_path):
+                continue
+
+            window = from_bounds(*tile_bounds(lon, lat, width_km), transform=src.transform)
+            window = window.round_offsets().round_lengths()
+            data = src.read(window=window, boundless=True, fill_value=0)
+
+            profile = src.profile.copy()
+            profile.update(
+                height=data.shape[1],
+                width=data.shape[2],
+                transform=src.window_transform(window),
+            )
+            profile.pop('blockxsize', None)
+            profile.pop('blockysize', None)
+            profile.pop('tiled', None)
+            with rasterio.open(out_path, 'w', **profile) as dst:
+                dst.write(data)
+            written.append(out_path)
+
+    print(f"Sliced {len(written)} tiles from {os.path.basename(mosaic_path)} into {output_dir}")
+    return written
@@ -0,0 +1,161 @@
+import os
+import json
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from tqdm import tqdm
+
+import gbio.src.transforms as tfm
+
+TILE_SHAPE = (150, 225, 3)
+MASK_SHAPE = (150, 225)
+
+INDEX_NAME = "index.npz"
+
+
+def fit_shape(img: np.ndarray, shape: tuple) -> np.ndarray:
+    """Crop or zero-pad an image to a fixed shape."""
+    out = np.zeros(shape, dtype=np.uint8)
+    h = min(shape[0], img.shape[0])
+    w = min(shape[1], img.shape[1])
+    out[:h, :w] = img[:h, :w]
+    return out
+
+def pack_city(df: pd.DataFrame,
+              img_dir: str,
+              mask_dir: str,
+              out_dir: str,
+              city: str) -> tuple[np.ndarray, np.ndarray]:
+    """Pack one city's stored tiles and masks into <city>_tiles.npy / <city>_masks.npy.
+
+    Rows sharing a stored image (virtual variations) share one slot. Returns the
+    slot and the transform to apply for every row of `df`, in order.
+    """
+    virtual = 'source_name' in df.columns
+    if virtual:
+        # Rows without a source (cities built without --virtual, mixed into combined.csv) are stored as-is
+        stored = df['source_name'].isna().to_numpy()
+        sources = df['source_name'].fillna(df['full_name'])
+        transforms = np.where(stored, 0, df['variation'].to_numpy()).astype(np.uint8)
+    else:
+        sources = df['full_name']
+        transforms = np.zeros(len(df), dtype=np.uint8)
+
+    # Masks follow the same sharing as images
+    mask_sources = df['landcover_object'] if 'landcover_object' in df.columns else None
+
+    # First-appearance order keeps consecutive rows in consecutive slots
+    slots, unique_sources = pd.factorize(sources)
+    assert (slots >= 0).all(), f"{city}: rows without a stored image name"
+    tiles = np.lib.format.open_memmap(os.path.join(out_dir, f"{city}_tiles.npy"),
+                                      mode='w+', dtype=np.uint8, shape=(len(unique_sources),) + TILE_SHAPE)
+    masks = np.lib.format.open_memmap(os.path.join(out_dir, f"{city}_masks.npy"),
+                                      mode='w+', dtype=np.uint8, shape=(len(unique_sources),) + MASK_SHAPE)
+
+    first_row = {}
+    for row, slot in enumerate(slots):
+        first_row.setdefault(slot, row)
+
+    for slot, name in enumerate(tqdm(unique_sources, desc=city)):
+        img = cv2.imread(os.path.join(img_dir, name))
+        if img is None:
+            raise ValueError(f"Image not found at {os.path.join(img_dir, name)}")
+        tiles[slot] = fit_shape(img, TILE_SHAPE)
+
+        if mask_sources is not None:
+            mask_name = mask_sources.iloc[first_row[slot]]
+            mask = cv2.imread(os.path.join(mask_dir, mask_name), cv2.IMREAD_GRAYSCALE)
+            if mask is None:
+                raise ValueError(f"Mask not found at {os.path.join(mask_dir, mask_name)}")
+            masks[slot] = fit_shape(mask, MASK_SHAPE)
+
+    tiles.flush()
+    masks.flush()
+    return np.asarray(slots, dtype=np.int64), transforms
+
+def pack_dataset(combined_csv: str,
+                 img_root: str,
+                 mask_root: str,
+                 out_dir: str) -> None:
+    """Export every city of combined.csv into packed memmaps plus an id-aligned index."""
+    os.makedirs(out_dir, exist_ok=True)
+    df = pd.read_csv(combined_csv, index_col="id")
+
+    cities = list(dict.fromkeys(df['city']))
+    n = int(df.index.max()) + 1 if len(df) else 0
+    city_code = np.full(n, -1, dtype=np.int16)
+    slot = np.full(n, -1, dtype=np.int64)
+    transform = np.zeros(n, dtype=np.uint8)
+
+    for code, city in enumerate(cities):
+        city_df = df[df['city'] == city]
+        slots, transforms = pack_city(city_df,
+                                      img_dir=os.path.join(img_root, city),
+                                      mask_dir=os.path.join(mask_root, city),
+                                      out_dir=out_dir,
+                                      city=city)
+        ids = city_df.index.to_numpy()
+        city_code[ids] = code
+        slot[ids] = slots
+        transform[ids] = transforms
+
+    np.savez(os.path.join(out_dir, INDEX_NAME), city_code=city_code, slot=slot, transform=transform)
+    with open(os.path.join(out_dir, "cities.json"), 'w') as f:
+        json.dump(cities, f)
+    print(f"Packed {len(df)} rows from {len(cities)} cities into {out_dir}")
+
+
+class TileStore:
+    """Read-only view over a packed dataset; tiles and masks are memory-mapped per city."""
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "cities.json")) as f:
+            self.cities = json.load(f)
+        with np.load(os.path.join(store_dir, INDEX_NAME)) as index:
+            self.city_code = index['city_code']
+            self.slot = index['slot']
+            self.transform = index['transform']
+        self._tiles = {}
+        self._masks = {}
+
+    def __len__(self) -> int:
+        return int((self.city_code >= 0).sum())
+
+    def _arrays(self, code: int) -> tuple[np.ndarray, np.ndarray]:
+        if code not in self._tiles:
+            city = self.cities[code]
+            self._tiles[code] = np.load(os.path.join(self.store_dir, f"{city}_tiles.npy"), mmap_mode='r')
+            self._masks[code] = np.load(os.path.join(self.store_dir, f"{city}_masks.npy"), mmap_mode='r')
+        return self._tiles[code], self._masks[code]
+
+    def get(self, id: int) -> tuple[np.ndarray, np.ndarray]:
+        """Zero-copy (tile, mask) views for one combined.csv id."""
+        code = int(self.city_code[id])
+        if code < 0:
+            raise KeyError(id)
+        tiles, masks = self._arrays(code)
+        slot = self.slot[id]
+        variation = int(self.transform[id])
+        return tfm.transform_view(tiles[slot], variation), tfm.transform_view(masks[slot], variation)
+
+    def get_batch(self, ids) -> tuple[np.ndarray, np.ndarray]:
+        """Stacked (tiles, masks) for many ids.
+
+        A contiguous untransformed run within one city is returned as a zero-copy
+        slice of the memmap; anything else is gathered into new arrays.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        codes = self.city_code[ids]
+        slots = self.slot[ids]
+        if (len(ids) and (codes == codes[0]).all() and codes[0] >= 0
+                and not self.transform[ids].any() and (np.diff(slots) == 1).all()):
+            tiles, masks = self._arrays(int(codes[0]))
+            return tiles[slots[0]:slots[-1] + 1], masks[slots[0]:slots[-1] + 1]
+
+        out_tiles = np.empty((len(ids),) + TILE_SHAPE, dtype=np.uint8)
+        out_masks = np.empty((len(ids),) + MASK_SHAPE, dtype=np.uint8)
+        for i, id in enumerate(ids):
+            out_tiles[i], out_masks[i] = self.get(int(id))
+        return out_tiles, out_masks
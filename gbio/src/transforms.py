@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+
+# Variation ids used in the dataset tables; 0 is the base tile
+IDENTITY = 0
+ROTATE_180 = 1
+FLIP_HORIZONTAL = 2
+FLIP_VERTICAL = 3
+
+TRANSFORM_IDS = [IDENTITY, ROTATE_180, FLIP_HORIZONTAL, FLIP_VERTICAL]
+
+
+def apply_transform(img: np.ndarray, variation: int) -> np.ndarray:
+    """Apply the augmentation identified by `variation` to an image or mask."""
+    if variation == IDENTITY:
+        return img
+    if variation == ROTATE_180:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if variation == FLIP_HORIZONTAL:
+        return cv2.flip(img, 1)
+    if variation == FLIP_VERTICAL:
+        return cv2.flip(img, 0)
+    raise ValueError(f"Unknown variation id: {variation}")
+
+def load_variation(path: str, variation: int, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """Read a stored base tile (or mask) and apply the variation lazily."""
+    img = cv2.imread(path, flags)
+    if img is None:
+        raise ValueError(f"Image not found at {path}")
+    return apply_transform(img, variation)
+
+def transform_view(arr: np.ndarray, variation: int) -> np.ndarray:
+    """Same as apply_transform on the leading (H, W) axes, but as a zero-copy NumPy view."""
+    if variation == IDENTITY:
+        return arr
+    if variation == ROTATE_180:
+        return arr[::-1, ::-1]
+    if variation == FLIP_HORIZONTAL:
+        return arr[:, ::-1]
+    if variation == FLIP_VERTICAL:
+        return arr[::-1]
+    raise ValueError(f"Unknown variation id: {variation}")
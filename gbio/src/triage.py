@@ -0,0 +1,120 @@
+import os
+import json
+
+import cv2
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+import gbio.src.metrics as metrics
+
+# Thumbnail (h, w) every tile is reduced to before scoring; nearest-neighbour keeps nodata pixels exact
+THUMB_SHAPE = (40, 64)
+
+THRESHOLDS = {
+    'max_nodata': 0.5,       # fraction of all-zero (Earth Engine nodata) pixels
+    'min_std': 1.0,          # grey-level standard deviation of valid pixels; blank tiles sit near 0
+    # Raw exports are dark (median grey ~24, 5th percentile ~16; dense woodland ~9), so
+    # a tile only counts as dark when it is also nearly featureless
+    'min_brightness': 10.0,  # mean grey level of valid pixels
+    'dark_max_std': 2.0,
+    'max_brightness': 245.0,
+    'max_cloud': 0.6,        # fraction of bright, unsaturated (white/grey) valid pixels
+}
+
+CLOUD_MIN_LEVEL = 200   # every channel at least this bright...
+CLOUD_MAX_SPREAD = 30   # ...and channels within this range of each other
+
+
+def read_thumbnail(path: str) -> np.ndarray:
+    """Tile reduced to THUMB_SHAPE (BGR uint8), or None if it cannot be decoded.
+
+    Decoded at full resolution: cv2's reduced decodes interpolate, which would blend
+    nodata zeros into their neighbours.
+    """
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    return cv2.resize(img, (THUMB_SHAPE[1], THUMB_SHAPE[0]), interpolation=cv2.INTER_NEAREST)
+
+def tile_stats(thumbs: np.ndarray) -> dict[str, np.ndarray]:
+    """Per-tile nodata fraction, brightness, grey-level std and cloud fraction for an (N, h, w, 3) batch."""
+    pixels = thumbs.reshape(len(thumbs), -1, 3)
+    b, g, r = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    lo = np.minimum(np.minimum(b, g), r)
+    hi = np.maximum(np.maximum(b, g), r)
+    valid = hi > 0
+    n_valid = np.maximum(valid.sum(axis=1), 1)
+
+    grey = 0.114 * b.astype(np.float32) + 0.587 * g + 0.299 * r # BGR luma
+    grey *= valid
+    mean = grey.sum(axis=1) / n_valid
+    var = (grey * grey).sum(axis=1) / n_valid - mean * mean
+
+    cloudy = (lo >= CLOUD_MIN_LEVEL) & (hi - lo <= CLOUD_MAX_SPREAD)
+    return {
+        'nodata': 1 - valid.sum(axis=1) / valid.shape[1],
+        'brightness': mean,
+        'std': np.sqrt(np.maximum(var, 0)),
+        'cloud': cloudy.sum(axis=1) / n_valid,
+    }
+
+def reject_reasons(stats: dict[str, np.ndarray], thresholds: dict = None) -> np.ndarray:
+    """First failed check per tile ('' when the tile passes)."""
+    t = dict(THRESHOLDS, **(thresholds or {}))
+    checks = [
+        ('nodata', stats['nodata'] > t['max_nodata']),
+        ('cloud', stats['cloud'] > t['max_cloud']),
+        ('blank', stats['std'] < t['min_std']),
+        ('dark', (stats['brightness'] < t['min_brightness']) & (stats['std'] < t['dark_max_std'])),
+        ('bright', stats['brightness'] > t['max_brightness']),
+    ]
+    reasons = np.full(len(stats['nodata']), '', dtype=object)
+    for reason, failed in reversed(checks):
+        reasons[failed] = reason
+    return reasons
+
+def triage(paths: list[str],
+           thresholds: dict = None,
+           workers: int = 8,
+           chunk: int = 1024) -> dict[str, dict]:
+    """Score raw tiles in batches; returns {file name: stats and reason} for rejected tiles only."""
+    rejected = {}
+    with metrics.timer("triage"), ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(paths), chunk):
+            batch = paths[start:start + chunk]
+            thumbs = list(pool.map(read_thumbnail, batch))
+            for path, thumb in zip(batch, thumbs):
+                if thumb is None:
+                    rejected[os.path.basename(path)] = {'reason': 'unreadable'}
+            readable = [(p, t) for p, t in zip(batch, thumbs) if t is not None]
+            if not readable:
+                continue
+
+            stats = tile_stats(np.stack([t for _, t in readable]))
+            reasons = reject_reasons(stats, thresholds)
+            for i in np.nonzero(reasons != '')[0]:
+                entry = {k: round(float(v[i]), 4) for k, v in stats.items()}
+                entry['reason'] = reasons[i]
+                rejected[os.path.basename(readable[i][0])] = entry
+    metrics.count("tiles_triaged", len(paths))
+    metrics.count("tiles_rejected", len(rejected))
+    return rejected
+
+def report_path(csv_path: str, city: str) -> str:
+    return os.path.join(csv_path, f"{city}.triage.json")
+
+def save_report(path: str, rejected: dict[str, dict], n_tiles: int, thresholds: dict = None) -> None:
+    reasons = {}
+    for entry in rejected.values():
+        reasons[entry['reason']] = reasons.get(entry['reason'], 0) + 1
+    report = {
+        'tiles': n_tiles,
+        'rejected': len(rejected),
+        'reasons': reasons,
+        'thresholds': dict(THRESHOLDS, **(thresholds or {})),
+        'tiles_rejected': dict(sorted(rejected.items())),
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Triage rejected {len(rejected)} of {n_tiles} tiles: {reasons}")
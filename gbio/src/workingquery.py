@@ -1,7 +1,13 @@
-import ee
 import time
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import ee
+except ImportError: # grid helpers stay usable (e.g. by the local tiler) without the Earth Engine API
+    ee = None
+
 # ------------------------------
 # Helper functions
 # ------------------------------
@@ -77,6 +83,100 @@ def monitor_tasks(tasks, wait_sec=10):
                 unfinished.remove(t)
         time.sleep(wait_sec)
 
+def export_city_mosaic(lon_center: float, lat_center: float, width_km: float, tiles_per_side: int,
+                       folder: str, prefix: str, scale: int = 10):
+    """Export one brightened Sentinel-2 RGB mosaic covering a whole city grid.
+
+    Slice it locally with tiler.slice_mosaic using the same grid arguments.
+    """
+    import gbio.src.tiler as tiler # tiler builds on this module's grid helpers
+
+    grid = create_grid(lon_center, lat_center, width_km, tiles_per_side)
+    lon_min, lat_min, lon_max, lat_max = tiler.grid_bounds(grid, width_km)
+    geom = ee.Geometry.Rectangle([lon_min, lat_min, lon_max, lat_max])
+
+    collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
+                  .filterBounds(geom)
+                  .filterDate('2024-04-01', '2024-08-30')
+                  .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
+                  .filter(ee.Filter.calendarRange(10,14, 'hour')))
+
+    image = collection.median().select(['B4', 'B3', 'B2']).clip(geom)
+    image = image.divide(10000).multiply(255).uint8()  # scale to 0-255 for display
+
+    task = ee.batch.Export.image.toDrive(
+        image=image,
+        description=f'{prefix}_mosaic_{lat_center}_{lon_center}',
+        folder=folder,
+        fileNamePrefix=f'{prefix}_mosaic_{lat_center}_{lon_center}',
+        scale=scale,
+        region=geom,
+        crs='EPSG:4326',
+        maxPixels=1e10
+    )
+    task.start()
+    print(f"✅ Mosaic export started for city {lat_center}, {lon_center} ({len(grid)} tiles)")
+    return task
+
+TERMINAL_STATES = ['COMPLETED', 'FAILED', 'CANCELLED']
+
+def submit_tiles(grid: list[tuple[float, float]],
+                 tile_width_km: float,
+                 folder: str,
+                 prefix: str = 'tile',
+                 max_workers: int = 8):
+    """Submit export tasks for (lon, lat) tile centers concurrently, at most max_workers in flight."""
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(
+            lambda c: export_tile(c[0], c[1], tile_width_km, folder=folder, prefix=prefix),
+            grid))
+    elapsed = time.time() - start
+
+    tasks = [t for t in results if t]
+    rate = len(grid) / elapsed if elapsed > 0 else float('inf')
+    print(f"Submitted {len(tasks)} tasks ({len(grid) - len(tasks)} skipped) in {elapsed:.1f}s, {rate:.2f} tiles/s")
+    return tasks
+
+def monitor_tasks_bulk(tasks, wait_sec=10, max_wait_sec=300, backoff=2.0):
+    """Monitor export tasks with one bulk task-list call per poll.
+
+    The poll interval grows by `backoff` (up to max_wait_sec) while no task changes
+    state and resets to wait_sec when one does. Returns the final state per task id.
+    """
+    start = time.time()
+    pending = {t.id: t for t in tasks}
+    states = {}
+    delay = wait_sec
+    while pending:
+        try:
+            listing = ee.data.getTaskList()
+        except Exception as e:
+            print(f"⚠️ Error listing tasks: {e}")
+            listing = []
+
+        changed = False
+        for entry in listing:
+            task_id = entry.get('id')
+            if task_id not in pending:
+                continue
+            state = entry.get('state')
+            if states.get(task_id) != state:
+                states[task_id] = state
+                changed = True
+            if state in TERMINAL_STATES:
+                del pending[task_id]
+
+        done = len(tasks) - len(pending)
+        elapsed = time.time() - start
+        print(f"{done}/{len(tasks)} tasks finished after {elapsed:.0f}s ({done / elapsed if elapsed > 0 else 0:.3f} tasks/s)")
+        if not pending:
+            break
+
+        delay = wait_sec if changed else min(delay * backoff, max_wait_sec)
+        time.sleep(delay)
+    return states
+
 # ------------------------------
 # Main script
 # ------------------------------
@@ -85,17 +185,23 @@ def query_tasks(tile_width_km: float=1.5,
                 tiles_per_side: int=14, 
                 centers: list[tuple[float, float]] = [],
                 folder: str = 'Manchester_GEE',
-                earth_engine_project: str = 'geofenced-biodiversity-project'):
+                earth_engine_project: str = 'geofenced-biodiversity-project',
+                max_workers: int = 8,
+                mosaic: bool = False):
+    """With mosaic=True, export one image per city instead of one per tile; slice it with tiler.slice_mosaic."""
+    if ee is None:
+        raise ImportError("Exports require the Earth Engine API: pip install earthengine-api")
     ee.Authenticate()
     ee.Initialize(project=earth_engine_project)
 
     tasks = []
     for lat_center, lon_center in centers:
+        if mosaic:
+            tasks.append(export_city_mosaic(lon_center, lat_center, tile_width_km, tiles_per_side, folder=folder, prefix='tile'))
+            continue
         grid = create_grid(lon_center, lat_center, tile_width_km, tiles_per_side)
-        for lon, lat in grid:
-            task = export_tile(lon, lat, tile_width_km, folder=folder, prefix='tile')
-            if task:  # Only append tasks that actually started
-                tasks.append(task)
+        # Only tasks that actually started are returned
+        tasks.extend(submit_tiles(grid, tile_width_km, folder=folder, prefix='tile', max_workers=max_workers))
 
-    monitor_tasks(tasks)
+    monitor_tasks_bulk(tasks)
     print("✅ All tasks finished or skipped.")
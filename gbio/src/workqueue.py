@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import tempfile
+import multiprocessing
+
+import pandas as pd
+
+import gbio.src.process as prc
+import gbio.src.gbif_query as gbq
+import gbio.src.manifest as mf
+import gbio.src.metrics as metrics
+import gbio.src.species_matrix as spm
+import gbio.src.triage as trg
+
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+
+
+class WorkQueue():
+    """SQLite tile queue on shared storage, for city builds split across processes and hosts.
+
+    Workers claim batches of tiles under a lease; tiles whose lease expires (crashed
+    or stalled worker) are handed out again, up to `max_attempts` claims. The build
+    options are stored with the queue so every worker produces identical rows.
+    Rollback journal instead of WAL, since WAL needs shared memory that network
+    filesystems do not provide.
+    """
+    def __init__(self, db_path: str, max_attempts: int = MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS tiles (
+            city TEXT NOT NULL,
+            name TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending', -- pending, leased, done, failed
+            owner TEXT,
+            lease_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            reason TEXT,
+            PRIMARY KEY (city, name))""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tiles_state ON tiles (state, lease_until)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _transaction(self, fn):
+        # BEGIN IMMEDIATE takes the write lock up front, so claims never interleave
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn()
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return result
+
+    @property
+    def options(self) -> dict:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'options'").fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def enqueue(self, input_path_raw: str, skip: list[str] = None, **options) -> int:
+        """Add every tile under input_path_raw/<city>/ (already queued tiles are left as they are)."""
+        skip = skip or []
+        rows = []
+        for city in sorted(os.listdir(input_path_raw)):
+            city_path = os.path.join(input_path_raw, city)
+            if city in skip or not os.path.isdir(city_path):
+                continue
+            rows.extend((city, img) for img in sorted(os.listdir(city_path)) if not img.startswith('.'))
+
+        def add():
+            before = self._conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+            self._conn.executemany("INSERT OR IGNORE INTO tiles (city, name) VALUES (?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('options', ?)",
+                               (json.dumps(dict(options, input_path_raw=input_path_raw)),))
+            return self._conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0] - before
+        added = self._transaction(add)
+        print(f"Queued {added} new tiles ({len(rows)} found)")
+        return added
+
+    def claim(self, owner: str, batch: int = 8, lease_seconds: float = LEASE_SECONDS) -> list[tuple[str, str]]:
+        """Lease up to `batch` pending or expired tiles to `owner`."""
+        def take():
+            now = time.time()
+            # Expired leases that used up their attempts are given up on rather than handed out again
+            self._conn.execute("UPDATE tiles SET state = 'failed', owner = NULL, reason = COALESCE(reason, 'lease_expired') "
+                               "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?", (now, self.max_attempts))
+            rows = self._conn.execute(
+                "SELECT city, name, state FROM tiles "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY city, name LIMIT ?", (now, batch)).fetchall()
+            for city, name, state in rows:
+                if state == 'leased':
+                    metrics.count("queue_lease_expired")
+                self._conn.execute("UPDATE tiles SET state = 'leased', owner = ?, lease_until = ?, "
+                                   "attempts = attempts + 1 WHERE city = ? AND name = ?",
+                                   (owner, now + lease_seconds, city, name))
+            return [(city, name) for city, name, _ in rows]
+        return self._transaction(take)
+
+    def renew(self, owner: str, tiles: list[tuple[str, str]], lease_seconds: float = LEASE_SECONDS) -> None:
+        """Extend the lease of tiles still held by `owner`."""
+        until = time.time() + lease_seconds
+        self._transaction(lambda: self._conn.executemany(
+            "UPDATE tiles SET lease_until = ? WHERE city = ? AND name = ? AND owner = ? AND state = 'leased'",
+            [(until, city, name, owner) for city, name in tiles]))
+
+    def complete(self, owner: str, tiles: list[tuple[str, str]]) -> None:
+        # A worker whose lease was taken over may still finish; its rows are identical, so accept either
+        self._transaction(lambda: self._conn.executemany(
+            "UPDATE tiles SET state = 'done', owner = ?, reason = NULL WHERE city = ? AND name = ? AND state != 'done'",
+            [(owner, city, name) for city, name in tiles]))
+
+    def fail(self, owner: str, failures: dict[tuple[str, str], str], retry: bool = True) -> None:
+        """Return tiles to the queue with a reason, or mark them failed after max_attempts claims
+        (straight away with retry=False, e.g. for tiles rejected by triage)."""
+        attempts = self.max_attempts if retry else 0
+        self._transaction(lambda: self._conn.executemany(
+            "UPDATE tiles SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "owner = NULL, reason = ? WHERE city = ? AND name = ? AND owner = ? AND state = 'leased'",
+            [(attempts, reason, city, name, owner) for (city, name), reason in failures.items()]))
+
+    def retry_failed(self) -> int:
+        """Put failed tiles back in the queue with a fresh attempt budget."""
+        return self._transaction(lambda: self._conn.execute(
+            "UPDATE tiles SET state = 'pending', attempts = 0 WHERE state = 'failed'").rowcount)
+
+    def progress(self) -> dict[str, int]:
+        return dict(self._conn.execute("SELECT state, COUNT(*) FROM tiles GROUP BY state").fetchall())
+
+    def tiles(self, city: str = None, state: str = None) -> list[tuple]:
+        """(city, name, state, reason) rows, optionally filtered."""
+        query = "SELECT city, name, state, reason FROM tiles WHERE (? IS NULL OR city = ?) AND (? IS NULL OR state = ?) ORDER BY city, name"
+        return self._conn.execute(query, (city, city, state, state)).fetchall()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def local_cache_dir() -> str:
+    """Default species/response cache for workers: node-local, since their SQLite WAL
+    files need shared memory that network filesystems do not provide."""
+    return os.path.join(tempfile.gettempdir(), "gbio-cache")
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def part_dir(parts_path: str, city: str) -> str:
+    return os.path.join(parts_path, city)
+
+def _write_part(parts_path: str, city: str, owner: str, seq: int, entries: list[dict], species: dict, species_info: dict) -> None:
+    out_dir = part_dir(parts_path, city)
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, f"{owner}-{seq:06d}")
+    tmp_path = f"{stem}.csv.tmp"
+    pd.DataFrame(entries).to_csv(tmp_path, index=False)
+    spm.save_city_species(f"{stem}_species.npz", species, species_info=species_info)
+    # The CSV lands last, so a part is only picked up once both files exist
+    os.replace(tmp_path, f"{stem}.csv")
+
+def run_worker(queue_path: str,
+               output_path: str,
+               parts_path: str,
+               batch: int = 8,
+               lease_seconds: float = LEASE_SECONDS,
+               owner: str = None,
+               cache_dir: str = None) -> int:
+    """Claim and build tiles until none are claimable; returns the number of tiles built.
+
+    Each batch is written as a partial result under parts_path/<city>/ before its
+    tiles are marked done, so a crash loses at most the leased batch. A tile that
+    raises is returned to the queue with its error and the worker moves on.
+    Unless process.g is already set up, the worker's GBIFIO keeps its caches in
+    `cache_dir`, by default local_cache_dir() rather than the (possibly shared)
+    package directory.
+    """
+    owner = owner or worker_id()
+    queue = WorkQueue(queue_path)
+    options = queue.options
+    input_path_raw = options['input_path_raw']
+    landcover_path = options.get('landcover_path')
+    if prc.g is None:
+        prc.g = gbq.GBIFIO(silent=False, cache_dir=cache_dir or local_cache_dir())
+    if options.get('occurrence_store'):
+        prc.gbif().load_occurrence_store(options['occurrence_store'])
+
+    built = 0
+    seq = 0
+    while True:
+        claimed = queue.claim(owner, batch=batch, lease_seconds=lease_seconds)
+        if not claimed:
+            break
+        by_city = {}
+        for city, name in claimed:
+            by_city.setdefault(city, []).append(name)
+
+        for city, names in by_city.items():
+            if options.get('triage'):
+                rejected = trg.triage([os.path.join(input_path_raw, city, n) for n in names],
+                                      thresholds=options.get('triage_thresholds'))
+                queue.fail(owner, {(city, n): f"triage_{rejected[n]['reason']}" for n in rejected}, retry=False)
+                names = [n for n in names if n not in rejected]
+            save_dir = os.path.join(output_path, city)
+            os.makedirs(save_dir, exist_ok=True)
+            landcover_dir = None
+            if landcover_path is not None:
+                landcover_dir = os.path.join(landcover_path, city)
+                os.makedirs(landcover_dir, exist_ok=True)
+
+            entries, species, dropped, errors = [], {}, {}, {}
+            for name in names:
+                try:
+                    entries.extend(prc.process_img(img_path=os.path.join(input_path_raw, city, name),
+                                                   out_path=os.path.join(save_dir, name),
+                                                   city=city,
+                                                   concurrent=options.get('concurrent', False),
+                                                   landcover_dir=landcover_dir,
+                                                   virtual=options.get('virtual', False),
+                                                   species_out=species,
+                                                   dropped=dropped))
+                except Exception as e:
+                    print(f"Error building tile {city}/{name}: {e}")
+                    errors[(city, name)] = f"error_{type(e).__name__}"
+                    species.pop(name.replace('.tif', ''), None)
+                    metrics.count("queue_tile_errors")
+                # The whole claim stays leased until written, including other cities of the batch
+                queue.renew(owner, claimed, lease_seconds=lease_seconds)
+            prc.gbif().species_cache.commit()
+            queue.fail(owner, errors)
+
+            names = [n for n in names if (city, n) not in errors]
+            done = [(city, n) for n in names if n.replace('.tif', '') not in dropped]
+            if done:
+                _write_part(parts_path, city, owner, seq, entries, species, prc.species_info(species))
+                seq += 1
+            queue.complete(owner, done)
+            queue.fail(owner, {(city, n): dropped[n.replace('.tif', '')] for n in names
+                               if n.replace('.tif', '') in dropped})
+            built += len(done)
+
+    print(f"Worker {owner} built {built} tiles; queue: {queue.progress()}")
+    queue.close()
+    return built
+
+def run_local_workers(queue_path: str,
+                      output_path: str,
+                      parts_path: str,
+                      processes: int,
+                      batch: int = 8,
+                      lease_seconds: float = LEASE_SECONDS,
+                      cache_dir: str = None) -> int:
+    """Run `processes` independent workers on this host (e.g. to test a multi-node build)."""
+    if processes <= 1:
+        return run_worker(queue_path, output_path, parts_path, batch=batch, lease_seconds=lease_seconds, cache_dir=cache_dir)
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes) as pool:
+        jobs = [(queue_path, output_path, parts_path, batch, lease_seconds, None, cache_dir) for _ in range(processes)]
+        return sum(pool.starmap(run_worker, jobs))
+
+def merge_parts(queue_path: str,
+                parts_path: str,
+                csv_path: str) -> None:
+    """Merge partial results into the city CSVs, species matrices, manifests and drop reports.
+
+    Rows are deduplicated by full_name (a tile rebuilt after a lost lease yields the
+    same rows) and ordered by raw tile name and variation, as in incremental builds.
+    """
+    queue = WorkQueue(queue_path)
+    options = queue.options
+    progress = queue.progress()
+    if progress.get('pending') or progress.get('leased'):
+        print(f"Warning: merging an unfinished queue: {progress}")
+
+    os.makedirs(csv_path, exist_ok=True)
+    params = prc.build_params(landcover=options.get('landcover_path') is not None,
+                              virtual=options.get('virtual', False))
+    for city in sorted(os.listdir(parts_path)):
+        city_parts = part_dir(parts_path, city)
+        csvs = sorted(f for f in os.listdir(city_parts) if f.endswith('.csv'))
+        frames = [pd.read_csv(os.path.join(city_parts, f), float_precision="round_trip") for f in csvs]
+        if not frames:
+            continue
+        df = pd.concat(frames, ignore_index=True).drop_duplicates(subset='full_name', keep='last')
+        rows = df.to_dict(orient='records')
+        rows.sort(key=lambda r: (prc.raw_name(r['full_name']), int(r['variation'])))
+        prc.create_df(os.path.join(csv_path, f"{city}.csv"), rows)
+
+        species, info = {}, {}
+        for f in csvs:
+            part = os.path.join(city_parts, f.replace('.csv', '_species.npz'))
+            species.update(spm.load_city_species(part))
+            info.update(spm.load_species_info(part))
+        spm.save_city_species(spm.species_path(csv_path, city), species, species_info=info)
+
+        # Manifest as an incremental build would leave it, so later runs can use incremental=True
+        manifest = {'version': mf.MANIFEST_VERSION, 'params': mf.params_hash(params), 'tiles': {}}
+        for r in rows:
+            name = prc.raw_name(r['full_name'])
+            tile = manifest['tiles'].setdefault(name, {'rows': []})
+            tile['rows'].append(r['full_name'])
+        for name, tile in manifest['tiles'].items():
+            tile['hash'] = mf.file_hash(os.path.join(options['input_path_raw'], city, name))
+        mf.save_manifest(mf.manifest_path(csv_path, city), manifest)
+
+        failed = {name.replace('.tif', ''): reason for _, name, _, reason in queue.tiles(city=city, state='failed')}
+        prc.save_dropped(csv_path, city, failed)
+        print(f"Merged {len(csvs)} parts into {city}: {len(rows)} rows")
+    queue.close()
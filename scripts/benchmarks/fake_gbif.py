@@ -0,0 +1,116 @@
+# Local stand-in for the GBIF occurrence and species endpoints used by GBIFIO.
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+REDLIST_CODES = ['EX', 'EW', 'CR', 'EN', 'VU', 'NT', 'LC', 'DD', 'NE']
+
+
+class FakeGBIF:
+    """Deterministic fake GBIF API on 127.0.0.1 with a fixed per-request latency.
+
+    Facet responses depend only on the query geometry, species records only on the key,
+    so repeated runs see identical data. With `error_rate`, that fraction of requests
+    fails with a 429 or 503 (seeded, so the failure pattern is repeatable too).
+    """
+    def __init__(self, latency: float = 0.0, species_per_tile: int = 120, species_pool: int = 2000, port: int = 0,
+                 error_rate: float = 0.0, rate_limit: float = 10000):
+        self.latency = latency
+        self.rate_limit = rate_limit # client-side request rate written into config_yaml
+        self.error_rate = error_rate
+        self.errors = 0
+        self._rng = random.Random(0)
+        self.species_per_tile = species_per_tile
+        self.species_pool = species_pool
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        fake = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                    status = fake._rng.choice([429, 503]) if fake._rng.random() < fake.error_rate else None
+                    if status is not None:
+                        fake.errors += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if status is not None:
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = fake.respond(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def respond(self, path: str):
+        parsed = urlparse(path)
+        query = parse_qs(parsed.query)
+
+        if parsed.path == "/v1/occurrence/search":
+            seed = zlib.crc32(query.get("geometry", [""])[0].encode())
+            keys = [(seed + 7919 * i) % self.species_pool + 1 for i in range(self.species_per_tile)]
+            counts = [{"name": str(k), "count": 1 + (seed + k) % 50} for k in dict.fromkeys(keys)]
+            return {"count": sum(c["count"] for c in counts), "results": [],
+                    "facets": [{"field": "SPECIES_KEY", "counts": counts}]}
+
+        m = re.fullmatch(r"/v1/species/(\d+)(/iucnRedListCategory)?", parsed.path)
+        if m:
+            key = int(m.group(1))
+            if m.group(2):
+                return {"category": "", "code": REDLIST_CODES[key % len(REDLIST_CODES)]}
+            return {"key": key, "speciesKey": key, "scientificName": f"Species {key}", "kingdom": "Animalia"}
+        return None
+
+    def config_yaml(self) -> str:
+        return (
+            "api-paths:\n"
+            "  GBIF_SEARCH:\n"
+            "    name: GBIF_SEARCH\n"
+            f"    url: {self.url}/occurrence/search\n"
+            "  GBIF_SPECIES:\n"
+            "    name: GBIF_SPECIES\n"
+            f"    url: {self.url}/species\n"
+            "request-limits:\n"
+            f"  rate: {self.rate_limit}\n"
+        )
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,41 @@
+# Micro-benchmark: per-tile cost of the legacy, LUT and batched filter paths.
+import time
+
+import cv2
+import numpy as np
+
+import gbio.src.process as prc
+
+
+def legacy_filters(img):
+    img_cropped = img[0:150, 0:225]
+    sharpened = cv2.filter2D(img_cropped, -2, prc.sharpness_kernel)
+    return np.uint8(255 * (sharpened / 255) ** (1/prc.GAMMA))
+
+def per_tile_us(fn, repeats: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main(n_tiles: int = 256):
+    rng = np.random.default_rng(0)
+    imgs = rng.integers(0, 256, size=(n_tiles, 167, 242, 3), dtype=np.uint8)
+
+    expected = np.stack([legacy_filters(img) for img in imgs])
+    assert np.array_equal(expected, np.stack([prc.apply_filters(img) for img in imgs]))
+    assert np.array_equal(expected, prc.apply_filters_batch(imgs))
+
+    results = {
+        'legacy': per_tile_us(lambda: [legacy_filters(img) for img in imgs]),
+        'apply_filters (LUT)': per_tile_us(lambda: [prc.apply_filters(img) for img in imgs]),
+        'apply_filters_batch': per_tile_us(lambda: prc.apply_filters_batch(imgs)),
+    }
+    for name, seconds in results.items():
+        print(f"{name:>22}: {1e6 * seconds / n_tiles:8.1f} us/tile")
+
+
+if __name__ == "__main__":
+    main()
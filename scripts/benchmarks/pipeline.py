@@ -0,0 +1,111 @@
+# End-to-end dataset build benchmark on synthetic tiles against a local fake GBIF.
+#
+#   python scripts/benchmarks/pipeline.py --tiles-per-side 7 --latency 0.005 --out bench.json
+#
+# Results are JSON (tiles/s, requests/s, peak RSS, git commit) so runs can be compared across commits.
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_gbif
+import synthetic
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 ** 2 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / scale
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+def run(tiles_per_side: int, latency: float, workers: int, concurrent: bool, error_rate: float = 0.0) -> dict:
+    import gbio.src.gbif_query as gbq
+    import gbio.src.process as prc
+    import gbio.src.landcover as lcv
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as root, fake_gbif.FakeGBIF(latency=latency, error_rate=error_rate) as server:
+        raw = os.path.join(root, "sat", "raw")
+        processed = os.path.join(root, "sat", "processed")
+        landcover = os.path.join(root, "landcover", "processed")
+        csv_dir = os.path.join(root, "csv", "seperate")
+        os.makedirs(csv_dir)
+
+        n_tiles = len(synthetic.generate_city(os.path.join(raw, "Synthetic"), tiles_per_side=tiles_per_side))
+
+        config_path = os.path.join(root, "config.yml")
+        with open(config_path, "w") as f:
+            f.write(server.config_yaml())
+        prc.g = gbq.GBIFIO(config_path=config_path, cache_dir=os.path.join(root, "cache"))
+
+        results = {}
+        elapsed = timed(prc.process_sats, raw, processed, csv_dir, override=True,
+                        workers=workers, concurrent=concurrent)
+        results["process_sats"] = {
+            "seconds": elapsed,
+            "tiles_per_s": n_tiles / elapsed,
+            "requests": server.requests,
+            "injected_errors": server.errors,
+            "rows": len(pd.read_csv(os.path.join(csv_dir, "Synthetic.csv"))),
+            "requests_per_s": server.requests / elapsed,
+        }
+
+        rows = 4 * n_tiles
+        elapsed = timed(lcv.process_sats, processed, landcover, csv_dir)
+        results["landcover_process_sats"] = {"seconds": elapsed, "images_per_s": rows / elapsed}
+
+        elapsed = timed(prc.combine_csvs, csv_dir, os.path.join(root, "combined.csv"))
+        results["combine_csvs"] = {"seconds": elapsed, "rows_per_s": rows / elapsed}
+
+        return {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "tiles": n_tiles,
+            "latency_s": latency,
+            "workers": workers,
+            "concurrent": concurrent,
+            "error_rate": error_rate,
+            "stages": results,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dataset build on synthetic tiles and a fake GBIF.")
+    parser.add_argument("--tiles-per-side", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds added to every fake GBIF response")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrent", action="store_true", help="resolve species concurrently")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake GBIF requests failing with 429/503")
+    parser.add_argument("--out", default=None, help="write the JSON result here as well as stdout")
+    args = parser.parse_args()
+
+    result = run(args.tiles_per_side, args.latency, args.workers, args.concurrent, args.error_rate)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# Synthetic raw tiles named like the Earth Engine exports: tile_<lat>_<lon>.tif
+import os
+
+import cv2
+import numpy as np
+
+import gbio.src.tiler as tiler
+
+
+def generate_city(output_dir: str,
+                  lat_center: float = 52.48,
+                  lon_center: float = -1.89,
+                  tile_width_km: float = 1.5,
+                  tiles_per_side: int = 7,
+                  shape: tuple[int, int] = (152, 241),
+                  seed: int = 0) -> list[str]:
+    """Write one raw .tif per grid cell with smooth, vegetation-like noise."""
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for lon, lat in tiler.create_grid(lon_center, lat_center, tile_width_km, tiles_per_side):
+        base = rng.integers(40, 160, size=(shape[0] // 8 + 1, shape[1] // 8 + 1, 3), dtype=np.uint8)
+        img = cv2.resize(base, (shape[1], shape[0]), interpolation=cv2.INTER_LINEAR)
+        img = cv2.add(img, rng.integers(0, 20, size=img.shape, dtype=np.uint8))
+        path = os.path.join(output_dir, f"{tiler.tile_name(lon, lat)}.tif")
+        cv2.imwrite(path, img)
+        paths.append(path)
+    return paths
@@ -0,0 +1,82 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import gbio.src.gbif_query as gbq
+import gbio.src.process as prc
+import gbio.src.scheduler as sched
+
+LATS = [52.05, 52.1, 52.15]
+LONS = [-1.95, -1.9, -1.85]
+
+
+def write_city(raw_dir: str, city: str = "Testville", seed: int = 0) -> list[str]:
+    """3x3 grid of small raw tiles named like the Earth Engine exports."""
+    city_dir = os.path.join(raw_dir, city)
+    os.makedirs(city_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    names = []
+    for lat in LATS:
+        for lon in LONS:
+            base = rng.integers(40, 160, size=(20, 31, 3), dtype=np.uint8)
+            img = cv2.resize(base, (241, 152), interpolation=cv2.INTER_LINEAR)
+            name = f"tile_{lat}_{lon}.tif"
+            cv2.imwrite(os.path.join(city_dir, name), img)
+            names.append(name)
+    return names
+
+def write_occurrences(path: str, n: int = 5000, seed: int = 0) -> str:
+    """Occurrence export covering the test grid, in GBIF's tab-separated layout."""
+    rng = np.random.default_rng(seed)
+    codes = ['LC', 'LC', 'LC', 'VU', 'EN']
+    rows = ["speciesKey\tdecimalLatitude\tdecimalLongitude\tiucnRedListCategory\tkingdomKey"]
+    for _ in range(n):
+        key = int(rng.integers(1, 300))
+        rows.append(f"{key}\t{rng.uniform(52.0, 52.2)}\t{rng.uniform(-2.0, -1.8)}\t{codes[key % len(codes)]}\t1")
+    with open(path, "w") as f:
+        f.write("\n".join(rows) + "\n")
+    return path
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict = None):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body
+
+    def json(self):
+        return self._body
+
+class FakeSession:
+    """Stands in for GBIFIO.session, answering GETs with respond(url, params) -> FakeResponse."""
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        return self.respond(url, params)
+
+
+@pytest.fixture
+def raw_dir(tmp_path):
+    raw = str(tmp_path / "raw")
+    write_city(raw)
+    return raw
+
+@pytest.fixture
+def local_gbif(tmp_path, monkeypatch):
+    """GBIFIO answering from a local occurrence store, installed as process.g."""
+    g = gbq.GBIFIO(cache_dir=str(tmp_path / "cache"),
+                   occurrence_store=write_occurrences(str(tmp_path / "occ.csv")))
+    monkeypatch.setattr(prc, "g", g)
+    return g
+
+@pytest.fixture
+def gbif(tmp_path, monkeypatch):
+    """GBIFIO for tests that replace its session with a FakeSession, installed as process.g."""
+    g = gbq.GBIFIO(cache_dir=str(tmp_path / "cache"),
+                   scheduler=sched.RequestScheduler(rate=1000, max_retries=2, backoff_base=0.001))
+    monkeypatch.setattr(prc, "g", g)
+    return g
@@ -0,0 +1,30 @@
+import os
+import threading
+
+import gbio.src.cache as cache
+
+
+def test_memo_keeps_unpicklable_results_in_memory(tmp_path):
+    calls = []
+
+    @cache.memoize(cache_dir=str(tmp_path))
+    def make_lock(name):
+        calls.append(name)
+        return threading.Lock()
+
+    lock = make_lock("a")
+    assert make_lock("a") is lock
+    assert calls == ["a"]
+    disk_dir = make_lock.memo.disk_dir
+    assert os.listdir(disk_dir) == [] # neither an entry nor a leftover .tmp file
+
+
+def test_memo_round_trips_through_disk(tmp_path):
+    @cache.memoize(cache_dir=str(tmp_path))
+    def square(x):
+        return x * x
+
+    assert square(4) == 16
+    fresh = cache.Memo(square.__wrapped__, cache_dir=str(tmp_path))
+    assert fresh(4) == 16
+    assert fresh.stats()['disk_hits'] == 1
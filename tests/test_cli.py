@@ -0,0 +1,42 @@
+import pandas as pd
+import requests
+
+import gbio.src.cli as cli
+import gbio.src.process as prc
+
+from conftest import FakeResponse
+
+FACETS = {'count': 5, 'results': [], 'facets': [{'field': 'SPECIES_KEY', 'counts': [{'name': '7', 'count': 3},
+                                                                                     {'name': '8', 'count': 2}]}]}
+
+
+def fake_gbif(self, url, params=None, timeout=None):
+    if url.endswith("/occurrence/search"):
+        return FakeResponse(200, FACETS)
+    if url.endswith("/iucnRedListCategory"):
+        return FakeResponse(200, {'code': 'NT'})
+    return FakeResponse(200, {'key': int(url.rsplit('/', 1)[1]), 'scientificName': 'x'})
+
+
+def no_network(self, url, params=None, timeout=None):
+    raise AssertionError(f"offline run went to the network: {url}")
+
+
+def test_offline_run_replays_recorded_responses(raw_dir, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    for name in ("csv1", "csv2"):
+        (tmp_path / name).mkdir()
+    monkeypatch.setattr(prc, "g", None)
+    monkeypatch.setattr(requests.Session, "get", fake_gbif)
+    cli.main(["process", raw_dir, str(tmp_path / "out1"), str(tmp_path / "csv1"),
+              "--response-cache", "--cache-dir", cache_dir])
+
+    monkeypatch.setattr(requests.Session, "get", no_network)
+    monkeypatch.setattr(prc, "g", None)
+    cli.main(["process", raw_dir, str(tmp_path / "out2"), str(tmp_path / "csv2"),
+              "--offline", "--cache-dir", cache_dir])
+
+    online = pd.read_csv(tmp_path / "csv1" / "Testville.csv", index_col="id")
+    offline = pd.read_csv(tmp_path / "csv2" / "Testville.csv", index_col="id")
+    assert len(online) == 36 and (online['redlist_NT'] == 2).all()
+    pd.testing.assert_frame_equal(offline, online)
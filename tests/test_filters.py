@@ -0,0 +1,14 @@
+import numpy as np
+
+import gbio.src.process as prc
+
+
+def test_apply_filters_batch_matches_per_tile_path():
+    imgs = np.random.default_rng(0).integers(0, 256, size=(3, 152, 241, 3), dtype=np.uint8)
+    np.testing.assert_array_equal(prc.apply_filters_batch(imgs), np.stack([prc.apply_filters(i) for i in imgs]))
+
+
+def test_apply_filters_batch_empty():
+    for empty in ([], np.empty((0, 152, 241, 3), dtype=np.uint8)):
+        out = prc.apply_filters_batch(empty)
+        assert out.shape == (0, 150, 225, 3) and out.dtype == np.uint8
@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+
+import gbio.src.manifest as mf
+import gbio.src.process as prc
+
+
+def build(raw_dir, tmp_path, **kwargs):
+    csv_dir = tmp_path / "csv"
+    csv_dir.mkdir(exist_ok=True)
+    prc.process_sats(raw_dir, str(tmp_path / "out"), str(csv_dir), incremental=True, **kwargs)
+    return csv_dir / "Testville.csv"
+
+
+def test_stale_tiles_without_table_rebuilds_everything():
+    params = {'a': 1}
+    hashes = {'tile_1_2.tif': 'h1', 'tile_3_4.tif': 'h2'}
+    manifest = {'params': mf.params_hash(params),
+                'tiles': {'tile_1_2.tif': {'hash': 'h1', 'rows': ['0_tile_1_2.jpg']},
+                          'tile_3_4.tif': {'hash': 'h2', 'rows': ['0_tile_3_4.jpg']}}}
+    assert mf.stale_tiles(manifest, params, hashes, None) == list(hashes)
+    assert mf.stale_tiles(manifest, params, hashes, {'tile_1_2.tif': ['0_tile_1_2.jpg'],
+                                                     'tile_3_4.tif': ['0_tile_3_4.jpg']}) == []
+    # A tile whose rows are missing from the table is rebuilt even though its hash matches
+    assert mf.stale_tiles(manifest, params, hashes, {'tile_1_2.tif': ['0_tile_1_2.jpg']}) == ['tile_3_4.tif']
+
+
+def test_incremental_rebuild_after_deleted_csv(raw_dir, tmp_path, local_gbif):
+    df_path = build(raw_dir, tmp_path)
+    full = pd.read_csv(df_path, index_col="id", float_precision="round_trip")
+    assert len(full) == 9 * 4
+
+    # Touch one tile and delete the table: every tile must come back, not just the changed one
+    tile = os.path.join(raw_dir, "Testville", "tile_52.1_-1.9.tif")
+    with open(tile, "ab") as f:
+        f.write(b"\0")
+    os.remove(df_path)
+    build(raw_dir, tmp_path)
+    assert pd.read_csv(df_path, index_col="id", float_precision="round_trip").equals(full)
+
+
+def test_incremental_rebuild_after_truncated_csv(raw_dir, tmp_path, local_gbif):
+    df_path = build(raw_dir, tmp_path)
+    full = pd.read_csv(df_path, index_col="id", float_precision="round_trip")
+
+    full.iloc[:-4].to_csv(df_path)
+    build(raw_dir, tmp_path)
+    assert pd.read_csv(df_path, index_col="id", float_precision="round_trip").equals(full)
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+import gbio.src.loader as ld
+import gbio.src.process as prc
+import gbio.src.tilestore as ts
+
+from conftest import write_city
+
+
+def test_loader_reads_mixed_virtual_and_stored_cities(raw_dir, tmp_path, local_gbif):
+    write_city(raw_dir, city="Stored", seed=1)
+    out, csv = tmp_path / "out", tmp_path / "csv"
+    csv.mkdir()
+    prc.process_sats(raw_dir, str(out), str(csv), skip=["Stored"], virtual=True)
+    prc.process_sats(raw_dir, str(out), str(csv), skip=["Testville"])
+    combined = str(tmp_path / "combined.csv")
+    prc.combine_csvs(str(csv), combined)
+    assert pd.read_csv(combined)['source_name'].isna().any()
+
+    loader = ld.TileLoader(combined, str(out), batch_size=8)
+    images = np.concatenate([batch[0] for batch in loader])
+    assert len(images) == len(loader.df)
+
+    # Same pixels as the packed store, which handles mixed tables per row too
+    ts.pack_dataset(combined, str(out), str(tmp_path / "masks"), str(tmp_path / "store"))
+    store = ts.TileStore(str(tmp_path / "store"))
+    np.testing.assert_array_equal(images, store.get_batch(loader.df.index.to_numpy())[0])
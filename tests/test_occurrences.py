@@ -0,0 +1,43 @@
+import pytest
+
+import gbio.src.cli as cli
+import gbio.src.occurrences as occ
+import gbio.src.process as prc
+
+ROWS = [(11, 52.1, -1.9, 'Animalia'), (12, 52.1, -1.9, 'Plantae'), (13, 52.11, -1.91, 'Animalia')]
+
+
+def write_export(path, kingdom_column):
+    header = ["speciesKey", "decimalLatitude", "decimalLongitude"] + ([kingdom_column] if kingdom_column else [])
+    lines = ["\t".join(header)]
+    for key, lat, lon, kingdom in ROWS:
+        value = []
+        if kingdom_column == "kingdom":
+            value = [kingdom]
+        elif kingdom_column == "kingdomKey":
+            value = ["1" if kingdom == "Animalia" else "6"]
+        lines.append("\t".join([str(key), str(lat), str(lon)] + value))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("column", ["kingdomKey", "kingdom"])
+def test_from_export_filters_on_kingdom(tmp_path, column):
+    index = occ.OccurrenceIndex.from_export(write_export(tmp_path / "occ.csv", column))
+    assert sorted(index.species_keys.tolist()) == [11, 13]
+
+
+def test_from_export_without_kingdom_columns(tmp_path):
+    path = write_export(tmp_path / "occ.csv", None)
+    with pytest.raises(ValueError):
+        occ.OccurrenceIndex.from_export(path)
+    assert len(occ.OccurrenceIndex.from_export(path, kingdom_key=None)) == 3
+
+
+def test_prefetch_refuses_local_store(raw_dir, tmp_path, local_gbif):
+    with pytest.raises(ValueError):
+        prc.process_sats(raw_dir, str(tmp_path / "out"), str(tmp_path), prefetch=True)
+    assert local_gbif.local_only and local_gbif.occurrence_index is not None
+
+    with pytest.raises(SystemExit):
+        cli.main(["process", raw_dir, "out", "csv", "--prefetch", "--occurrence-store", "occ.csv"])
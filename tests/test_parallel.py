@@ -0,0 +1,13 @@
+import pandas as pd
+
+import gbio.src.process as prc
+
+
+def test_parallel_render_matches_serial(raw_dir, tmp_path, local_gbif):
+    for workers in (1, 2):
+        csv = tmp_path / f"csv{workers}"
+        csv.mkdir()
+        prc.process_sats(raw_dir, str(tmp_path / f"out{workers}"), str(csv), workers=workers)
+    serial = pd.read_csv(tmp_path / "csv1" / "Testville.csv", index_col="id", float_precision="round_trip")
+    parallel = pd.read_csv(tmp_path / "csv2" / "Testville.csv", index_col="id", float_precision="round_trip")
+    pd.testing.assert_frame_equal(parallel, serial)
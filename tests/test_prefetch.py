@@ -0,0 +1,87 @@
+import re
+
+import numpy as np
+
+import gbio.src.occurrences as occ
+import gbio.src.process as prc
+
+from conftest import FakeResponse, FakeSession, LATS, LONS
+
+STACKED = (52.1037, -1.9042) # many records sharing one coordinate, as for a bulk-imported survey
+
+
+def occurrence_search(points: np.ndarray):
+    """Fake /occurrence/search over (speciesKey, lat, lon) rows: counts and pages by polygon."""
+    def respond(url, params):
+        coords = [tuple(map(float, c.split())) for c in re.findall(r"[-\d.]+ [-\d.]+", params['geometry'])]
+        lons, lats = zip(*coords)
+        inside = points[(points[:, 1] >= min(lats)) & (points[:, 1] <= max(lats)) &
+                        (points[:, 2] >= min(lons)) & (points[:, 2] <= max(lons))]
+        if params.get('facet') == 'speciesKey':
+            keys, counts = np.unique(inside[:, 0].astype(int), return_counts=True)
+            return FakeResponse(200, {'count': len(inside), 'results': [], 'facets': [
+                {'field': 'SPECIES_KEY', 'counts': [{'name': str(k), 'count': int(c)} for k, c in zip(keys, counts)]}]})
+        offset, limit = params.get('offset', 0), params['limit']
+        page = inside[offset:offset + limit]
+        results = [{'speciesKey': int(k), 'decimalLatitude': lat, 'decimalLongitude': lon} for k, lat, lon in page]
+        return FakeResponse(200, {'count': len(inside), 'results': results,
+                                  'endOfRecords': offset + limit >= len(inside)})
+    return respond
+
+
+def make_points(n=2000, stacked=400, seed=0):
+    rng = np.random.default_rng(seed)
+    spread = np.column_stack([rng.integers(1, 50, n), rng.uniform(52.0, 52.2, n), rng.uniform(-2.0, -1.8, n)])
+    pile = np.tile([7, *STACKED], (stacked, 1))
+    return np.vstack([spread, pile])
+
+
+def test_fetch_occurrences_stops_splitting_dense_boxes(gbif):
+    points = make_points()
+    gbif.session = FakeSession(occurrence_search(points))
+    records, dense = gbif.fetch_occurrences((52.0, 52.2, -2.0, -1.8), max_records=300, min_size_km=1.0)
+
+    assert len(dense) >= 1
+    for lat_min, lat_max, lon_min, lon_max in dense:
+        assert lat_min <= STACKED[0] <= lat_max or lon_min <= STACKED[1] <= lon_max
+    fetched = {(lat, lon) for _, lat, lon, _ in records}
+    assert STACKED not in fetched
+    # Everything outside the dense boxes was paged in exactly once
+    outside = [p for p in points if not any(b[0] <= p[1] <= b[1] and b[2] <= p[2] <= b[3] for b in dense)]
+    assert len(records) == len(outside)
+
+
+def test_prefetch_leaves_dense_tiles_to_facet_queries(gbif):
+    points = make_points()
+    gbif.session = FakeSession(occurrence_search(points))
+    bbox = occ.bbox_from_tiles([f"tile_{lat}_{lon}.tif" for lat in LATS for lon in LONS])
+    index = gbif.prefetch_occurrences(bbox, max_records=300, min_size_km=1.0)
+    assert index.dense
+    gbif.session.calls.clear()
+
+    # Away from the pile, tiles are answered from the index
+    lat, lon = 52.05, -1.95
+    far = gbif.request_by_geofence(coord=(lat, lon))
+    assert gbif.session.calls == []
+    lon_deg, lat_deg = gbif.km_to_deg(km=1.0, lat=lat)
+    box = (abs(points[:, 1] - lat) <= lat_deg) & (abs(points[:, 2] - lon) <= lon_deg)
+    assert far['count'] == box.sum()
+
+    # The tile over the pile falls back to its own facet query
+    near = gbif.request_by_geofence(coord=(52.1, -1.9))
+    assert len(gbif.session.calls) == 1
+    assert gbif.session.calls[0][1]['facet'] == 'speciesKey'
+    assert {c['name']: c['count'] for c in near['facets'][0]['counts']}['7'] >= 400
+
+
+def test_bbox_from_tiles_skips_empty_cities(tmp_path, gbif):
+    assert occ.bbox_from_tiles([]) is None
+    assert occ.bbox_from_tiles([".DS_Store", "notes_a_b.txt"]) is None
+
+    raw = tmp_path / "raw"
+    (raw / "Empty").mkdir(parents=True)
+    gbif.session = FakeSession(lambda url, params: FakeResponse(500))
+    csv = tmp_path / "csv"
+    csv.mkdir()
+    prc.process_sats(str(raw), str(tmp_path / "out"), str(csv), prefetch=True)
+    assert gbif.session.calls == []
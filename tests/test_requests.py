@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import gbio.src.gbif_query as gbq
+import gbio.src.metrics as metrics
+import gbio.src.process as prc
+
+from conftest import FakeResponse, FakeSession
+
+
+FACETS = {'count': 3, 'results': [], 'facets': [{'field': 'SPECIES_KEY', 'counts': [{'name': '7', 'count': 3}]}]}
+
+
+def test_scheduler_retries_transient_errors(gbif):
+    statuses = iter([503, 429, 200])
+    gbif.session = FakeSession(lambda url, params: FakeResponse(next(statuses), FACETS))
+    assert gbif.request(params={}) == FACETS
+    assert len(gbif.session.calls) == 3
+    assert gbif.last_failure() is None
+
+
+def test_scheduler_does_not_retry_client_errors(gbif):
+    gbif.session = FakeSession(lambda url, params: FakeResponse(404))
+    assert gbif.request(params={}) is None
+    assert len(gbif.session.calls) == 1
+    assert gbif.last_failure() == "http_404"
+
+
+def test_last_failure_is_cleared_by_a_successful_request(gbif):
+    gbif.session = FakeSession(lambda url, params: FakeResponse(404))
+    gbif.request(params={})
+    gbif.session = FakeSession(lambda url, params: FakeResponse(200, FACETS))
+    gbif.request(params={})
+    assert gbif.last_failure() is None
+
+
+def test_species_failure_reason_is_a_fixed_code(gbif):
+    def respond(url, params):
+        if url.endswith("/occurrence/search"):
+            return FakeResponse(200, FACETS)
+        if url.endswith("/iucnRedListCategory"):
+            return FakeResponse(503)
+        return FakeResponse(200, {'key': 7})
+    gbif.session = FakeSession(respond)
+
+    dropped = {}
+    assert prc.query_tile("/out/tile_52.1_-1.9.tif", dropped=dropped) is None
+    assert dropped == {'tile_52.1_-1.9': 'species_lookup_http_503'}
+
+    with pytest.raises(gbq.GBIFRequestError) as err:
+        gbif.process_output(FACETS)
+    assert err.value.reason == 'species_lookup_http_503'
+
+
+def test_unexpected_errors_map_to_exception_type(gbif):
+    gbif.session = FakeSession(lambda url, params: FakeResponse(200, {'facets': []}))
+    dropped = {}
+    prc.query_tile("/out/tile_52.1_-1.9.tif", dropped=dropped)
+    assert dropped == {'tile_52.1_-1.9': 'error_IndexError'}
+
+
+def test_prometheus_names_are_sanitized():
+    m = metrics.Metrics()
+    m.count("tiles_dropped_species lookup: 'x'")
+    m.add_time('stage "a"', 0.1)
+    for line in m.prometheus().splitlines():
+        if line.startswith("#"):
+            continue
+        name = line.split("{")[0].split(" ")[0]
+        assert re.fullmatch(r"[a-zA-Z0-9_]+", name), line
+    assert 'stage="stage \\"a\\""' in m.prometheus()
+
+
+def test_concurrent_species_lookups_share_one_request(gbif):
+    release = threading.Event()
+
+    def respond(url, params):
+        release.wait(5)
+        if url.endswith("/iucnRedListCategory"):
+            return FakeResponse(200, {'code': 'VU'})
+        return FakeResponse(200, {'key': 7, 'scientificName': 'Parus major'})
+    gbif.session = FakeSession(respond)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(gbif.get_species_name, 7) for _ in range(8)]
+        while not gbif._inflight:
+            time.sleep(0.001)
+        time.sleep(0.05) # let the other threads reach the in-flight lookup
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert all(r['redlist']['code'] == 'VU' for r in results)
+    assert len(gbif.session.calls) == 2 # species record and redlist, once
+    assert gbif._inflight == {}
+
+
+def test_coalesced_lookups_share_the_failure_reason(gbif):
+    release = threading.Event()
+
+    def respond(url, params):
+        release.wait(5)
+        return FakeResponse(404)
+    gbif.session = FakeSession(respond)
+
+    def lookup():
+        return gbif.get_species_name(7), gbif.last_failure()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(lookup) for _ in range(4)]
+        while not gbif._inflight:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        assert [f.result() for f in futures] == [(None, 'http_404')] * 4
+    assert len(gbif.session.calls) == 1
@@ -0,0 +1,41 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import gbio.src.spatial as spatial
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.deg2rad, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * spatial.EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+@pytest.fixture(params=[True, False], ids=["scipy", "numpy"])
+def index(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setitem(sys.modules, "scipy.spatial", None)
+    # Cities on the equator and at 60N: one shared projection latitude would distort both
+    names = [f"0_tile_{lat}_{lon}.jpg" for lat, lon in [(0.0, 10.0), (0.02, 10.0),
+                                                         (60.0, 10.0), (60.02, 10.0), (60.0, 10.03)]]
+    df = pd.DataFrame({'city': ['Equator'] * 2 + ['North'] * 3, 'full_name': names})
+    return spatial.TileIndex(df)
+
+
+def test_nearest_uses_each_points_own_latitude(index):
+    # 0.03 deg of longitude at 60N (~1.67 km) is closer than 0.02 deg of latitude (~2.22 km)
+    dist, idx = index.nearest([60.0], [10.0], k=3)
+    assert idx[0, 0] == 2
+    assert idx[0, 1] == 4
+    np.testing.assert_allclose(dist[0, 1], haversine_km(60.0, 10.0, 60.0, 10.03), rtol=1e-9)
+    np.testing.assert_allclose(dist[0, 2], haversine_km(60.0, 10.0, 60.02, 10.0), rtol=1e-9)
+
+
+def test_nearest_distances_are_great_circle_km(index):
+    lats, lons = np.array([0.005, 59.5, 61.0]), np.array([10.5, 10.0, 12.0])
+    dist, idx = index.nearest(lats, lons)
+    expected = haversine_km(lats, lons, index.lats[idx[:, 0]], index.lons[idx[:, 0]])
+    np.testing.assert_allclose(dist[:, 0], expected, rtol=1e-9)
+    assert idx[:, 0].tolist() == [0, 2, 3]
@@ -0,0 +1,71 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import gbio.src.process as prc
+import gbio.src.spatial as spatial
+import gbio.src.species_matrix as spm
+
+CODES = ['LC', 'LC', 'LC', 'VU', 'EN'] # conftest.write_occurrences assigns codes[key % 5]
+
+
+@pytest.fixture
+def csv_dir(raw_dir, tmp_path, local_gbif):
+    csv = tmp_path / "csv"
+    csv.mkdir()
+    prc.process_sats(raw_dir, str(tmp_path / "out"), str(csv))
+    return csv
+
+
+def brute_force(matrix, index, radius=1, species_mask=None):
+    keep = np.ones(matrix.shape[1], dtype=bool) if species_mask is None else species_mask
+    rows = matrix.rows_for(index.tiles['city'], index.tiles['stem'])
+    out = []
+    for t, nbrs in enumerate(index.adjacency(radius=radius)):
+        cols = set()
+        for r in rows[np.append(nbrs, t)]:
+            if r >= 0:
+                cols.update(c for c in matrix.indices[matrix.indptr[r]:matrix.indptr[r + 1]] if keep[c])
+        out.append(len(cols))
+    return np.array(out)
+
+
+def test_from_cities_reads_stored_species_metadata(csv_dir):
+    matrix = spm.SpeciesMatrix.from_cities(str(csv_dir))
+    assert matrix.shape[0] == 9
+    expected = [CODES[k % len(CODES)] for k in matrix.species['species_key']]
+    assert matrix.species['redlist'].astype(str).tolist() == expected
+
+
+def test_from_cities_without_metadata_needs_species_cache(tmp_path):
+    spm.save_city_species(spm.species_path(str(tmp_path), "Old"), {'tile_1_2': [(5, 3)]})
+    with pytest.raises(KeyError):
+        spm.SpeciesMatrix.from_cities(str(tmp_path))
+
+    cache = {5: {'scientificName': 'Parus major', 'redlist': {'code': 'LC'}}}
+    matrix = spm.SpeciesMatrix.from_cities(str(tmp_path), species_cache=cache)
+    assert matrix.species.loc[0, 'name'] == 'Parus major'
+    assert matrix.species.loc[0, 'redlist'] == 'LC'
+
+
+@pytest.mark.parametrize("scipy", [True, False])
+def test_neighbourhood_richness_follows_index_order(csv_dir, monkeypatch, scipy):
+    if not scipy:
+        monkeypatch.setitem(sys.modules, "scipy.sparse", None)
+    matrix = spm.SpeciesMatrix.from_cities(str(csv_dir))
+    # Shuffled table, so index order differs from matrix order; one tile has no species record
+    df = pd.read_csv(csv_dir / "Testville.csv", index_col="id").sample(frac=1, random_state=0)
+    df = pd.concat([df, pd.DataFrame({'city': ['Testville'], 'full_name': ['0_tile_52.2_-1.9.jpg']})])
+    index = spatial.TileIndex(df)
+    assert (matrix.rows_for(index.tiles['city'], index.tiles['stem']) != np.arange(len(index))).any()
+
+    result = matrix.neighbourhood_richness(index)
+    assert len(result) == len(index)
+    np.testing.assert_array_equal(result, brute_force(matrix, index))
+    assert (result >= matrix.richness().max()).all()
+
+    mask = matrix.redlist_mask(['VU', 'EN'])
+    np.testing.assert_array_equal(matrix.neighbourhood_richness(index, radius=2, species_mask=mask),
+                                  brute_force(matrix, index, radius=2, species_mask=mask))
@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pytest
+
+import gbio.src.cli as cli
+import gbio.src.tiler as tiler
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.transform import from_origin
+
+LAT, LON, WIDTH_KM, SIDE = 53.48, -2.24, 1.5, 3
+RES = 0.0002 # degrees per pixel
+
+
+def write_mosaic(path):
+    lon_min, lat_min, lon_max, lat_max = tiler.grid_bounds(tiler.create_grid(LON, LAT, WIDTH_KM, SIDE), WIDTH_KM)
+    width = int(np.ceil((lon_max - lon_min) / RES))
+    height = int(np.ceil((lat_max - lat_min) / RES))
+    rows, cols = np.mgrid[0:height, 0:width]
+    data = np.stack([rows % 256, cols % 256, (rows // 256 + cols // 256) % 256]).astype(np.uint8)
+    transform = from_origin(lon_min, lat_max, RES, RES)
+    with rasterio.open(path, 'w', driver='GTiff', height=height, width=width, count=3, dtype='uint8',
+                       crs='EPSG:4326', transform=transform) as dst:
+        dst.write(data)
+    return data, transform
+
+
+def test_slice_mosaic_cli_cuts_every_grid_cell(tmp_path):
+    mosaic = str(tmp_path / "mosaic.tif")
+    data, transform = write_mosaic(mosaic)
+    out = tmp_path / "City"
+    assert cli.main(["slice", mosaic, str(out), f"--center={LAT},{LON}",
+                     "--tile-width-km", str(WIDTH_KM), "--tiles-per-side", str(SIDE)]) == 0
+
+    grid = tiler.create_grid(LON, LAT, WIDTH_KM, SIDE)
+    assert sorted(os.listdir(out)) == sorted(f"{tiler.tile_name(lon, lat)}.tif" for lon, lat in grid)
+    for lon, lat in grid:
+        with rasterio.open(out / f"{tiler.tile_name(lon, lat)}.tif") as tile:
+            lon_min, lat_min, lon_max, lat_max = tiler.tile_bounds(lon, lat, WIDTH_KM)
+            assert abs(tile.bounds.left - lon_min) <= RES and abs(tile.bounds.top - lat_max) <= RES
+            assert abs(tile.bounds.right - lon_max) <= RES and abs(tile.bounds.bottom - lat_min) <= RES
+            # Pixels are copied unchanged from the matching mosaic window
+            row, col = rasterio.transform.rowcol(transform, tile.bounds.left + RES / 2, tile.bounds.top - RES / 2)
+            window = data[:, row:row + tile.height, col:col + tile.width]
+            pixels = tile.read()
+            np.testing.assert_array_equal(pixels[:, :window.shape[1], :window.shape[2]], window)
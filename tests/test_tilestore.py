@@ -0,0 +1,32 @@
+import os
+
+import cv2
+import numpy as np
+import pandas as pd
+
+import gbio.src.process as prc
+import gbio.src.tilestore as ts
+
+from conftest import write_city
+
+
+def test_pack_mixed_virtual_and_stored_cities(raw_dir, tmp_path, local_gbif):
+    write_city(raw_dir, city="Stored", seed=1)
+    out, csv = tmp_path / "out", tmp_path / "csv"
+    csv.mkdir()
+    prc.process_sats(raw_dir, str(out), str(csv), skip=["Stored"], virtual=True)
+    prc.process_sats(raw_dir, str(out), str(csv), skip=["Testville"])
+    prc.combine_csvs(str(csv), str(tmp_path / "combined.csv"))
+
+    df = pd.read_csv(tmp_path / "combined.csv", index_col="id")
+    assert df['source_name'].isna().any() and df['source_name'].notna().any()
+    ts.pack_dataset(str(tmp_path / "combined.csv"), str(out), str(tmp_path / "masks"), str(tmp_path / "store"))
+    store = ts.TileStore(str(tmp_path / "store"))
+
+    assert (store.slot >= 0).all()
+    for id, row in df[df['city'] == "Stored"].iterrows():
+        expected = ts.fit_shape(cv2.imread(os.path.join(out, "Stored", row['full_name'])), ts.TILE_SHAPE)
+        np.testing.assert_array_equal(store.get(id)[0], expected)
+    # Virtual rows still share one slot per location
+    virtual = df['city'] == "Testville"
+    assert len(np.unique(store.slot[df.index[virtual]])) == df.loc[virtual, 'source_name'].nunique()
@@ -0,0 +1,60 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import gbio.src.triage as trg
+
+
+def test_thumbnails_sample_pixels_without_blending(tmp_path):
+    # Nodata checkerboard: any interpolation would produce grey values between 0 and 200
+    img = np.zeros((152, 241, 3), dtype=np.uint8)
+    img[::2, ::2] = img[1::2, 1::2] = 200
+    path = str(tmp_path / "tile_52.1_-1.9.tif")
+    cv2.imwrite(path, img)
+
+    thumb = trg.read_thumbnail(path)
+    assert thumb.shape[:2] == trg.THUMB_SHAPE
+    assert set(np.unique(thumb)) <= {0, 200}
+    assert 0.3 < trg.tile_stats(thumb[None])['nodata'][0] < 0.7
+
+
+def test_triage_rejects_nodata_and_unreadable_tiles(tmp_path):
+    rng = np.random.default_rng(0)
+    good = rng.integers(40, 160, size=(152, 241, 3), dtype=np.uint8)
+    nodata = good.copy()
+    nodata[:, :160] = 0
+    paths = []
+    for name, img in [("good.tif", good), ("nodata.tif", nodata)]:
+        paths.append(str(tmp_path / name))
+        cv2.imwrite(paths[-1], img)
+    paths.append(str(tmp_path / "broken.tif"))
+    open(paths[-1], "wb").write(b"not an image")
+
+    rejected = trg.triage(paths, workers=2)
+    assert {name: entry['reason'] for name, entry in rejected.items()} == {'nodata.tif': 'nodata', 'broken.tif': 'unreadable'}
+
+
+REAL_TILES = os.path.join(os.path.dirname(__file__), os.pardir, "dataset", "sat", "raw")
+
+
+@pytest.mark.parametrize("city, name", [
+    ("Birmingham", "tile_52.568058706182974_-1.849833074858909.tif"), # Sutton Park woodland, richness 1000
+    ("Birmingham", "tile_52.58157221969649_-1.849833074858909.tif"),
+    ("Manchester", "tile_53.53288341959295_-2.3363158783141773.tif"),
+])
+def test_dark_real_exports_pass_triage(city, name):
+    path = os.path.join(REAL_TILES, city, name)
+    if not os.path.exists(path):
+        pytest.skip("raw dataset not checked out")
+    stats = trg.tile_stats(trg.read_thumbnail(path)[None])
+    assert stats['brightness'][0] < trg.THRESHOLDS['min_brightness'] # darker than the old floor
+    assert trg.triage([path]) == {}
+
+
+def test_dark_featureless_tiles_are_rejected(tmp_path):
+    path = str(tmp_path / "tile_0_0.tif")
+    noise = np.random.default_rng(0).integers(3, 9, size=(152, 241, 1), dtype=np.uint8)
+    cv2.imwrite(path, np.repeat(noise, 3, axis=2)) # grey ~5, std ~1.7
+    assert trg.triage([path])['tile_0_0.tif']['reason'] == 'dark'
@@ -0,0 +1,99 @@
+import sys
+import threading
+import types
+
+import pytest
+
+
+class Chain:
+    """Stands in for ee.Image / ee.ImageCollection: every method returns the chain."""
+    def __init__(self, ee, geom=None):
+        self.ee, self.geom = ee, geom
+
+    def filterBounds(self, geom):
+        return Chain(self.ee, geom)
+
+    def size(self):
+        return types.SimpleNamespace(getInfo=lambda: 0 if self.geom in self.ee.empty else 3)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+
+class FakeTask:
+    def __init__(self, ee, description):
+        self.ee, self.description, self.id = ee, description, f"T{description}"
+        self.started = False
+
+    def start(self):
+        with self.ee.lock:
+            self.ee.in_flight += 1
+            self.ee.peak = max(self.ee.peak, self.ee.in_flight)
+        threading.Event().wait(0.01) # time.sleep is patched out below
+        self.started = True
+        with self.ee.lock:
+            self.ee.in_flight -= 1
+
+
+def fake_ee_module(listings):
+    ee = types.ModuleType("ee")
+    ee.lock, ee.in_flight, ee.peak, ee.empty, ee.tasks = threading.Lock(), 0, 0, set(), []
+    ee.Geometry = types.SimpleNamespace(Rectangle=lambda coords: tuple(round(c, 6) for c in coords))
+    ee.Filter = types.SimpleNamespace(lt=lambda *a: None, calendarRange=lambda *a: None)
+    ee.ImageCollection = lambda name: Chain(ee)
+
+    def to_drive(description, **kwargs):
+        task = FakeTask(ee, description)
+        with ee.lock:
+            ee.tasks.append(task)
+        return task
+    ee.batch = types.SimpleNamespace(Export=types.SimpleNamespace(image=types.SimpleNamespace(toDrive=to_drive)))
+
+    def get_task_list():
+        listing = next(listings)
+        if isinstance(listing, Exception):
+            raise listing
+        return listing
+    ee.data = types.SimpleNamespace(getTaskList=get_task_list)
+    return ee
+
+
+@pytest.fixture
+def wkquery(monkeypatch):
+    listings = []
+    ee = fake_ee_module(iter(listings))
+    monkeypatch.setitem(sys.modules, "ee", ee)
+    import gbio.src.workingquery as wkquery
+    monkeypatch.setattr(wkquery, "ee", ee)
+    sleeps = []
+    monkeypatch.setattr(wkquery.time, "sleep", lambda s: sleeps.append(s) if s >= 1 else None)
+    return types.SimpleNamespace(module=wkquery, ee=ee, listings=listings, sleeps=sleeps)
+
+
+def test_submit_tiles_skips_empty_tiles_and_bounds_concurrency(wkquery):
+    wq, ee = wkquery.module, wkquery.ee
+    grid = wq.create_grid(-2.24, 53.48, 1.5, 3)
+    ee.empty.add(wq.get_bbox(*grid[4], 1.5))
+
+    tasks = wq.submit_tiles(grid, 1.5, folder="Test", max_workers=2)
+    assert len(tasks) == 8
+    assert all(t.started for t in tasks)
+    assert f"tile_{grid[4][1]}_{grid[4][0]}" not in {t.description for t in tasks}
+    assert 1 <= ee.peak <= 2
+
+
+def test_monitor_tasks_bulk_backs_off_until_all_finish(wkquery):
+    wq = wkquery.module
+    tasks = [types.SimpleNamespace(id=i) for i in ("a", "b")]
+    running = [{'id': 'a', 'state': 'RUNNING'}, {'id': 'b', 'state': 'READY'}, {'id': 'x', 'state': 'COMPLETED'}]
+    wkquery.listings.extend([
+        running,
+        running,                 # no change: wait grows
+        RuntimeError("quota"),   # listing errors are survived and count as no change
+        [{'id': 'a', 'state': 'COMPLETED'}, {'id': 'b', 'state': 'READY'}], # change: wait resets
+        [{'id': 'b', 'state': 'FAILED'}],
+    ])
+
+    states = wq.monitor_tasks_bulk(tasks, wait_sec=10, max_wait_sec=30, backoff=2.0)
+    assert states == {'a': 'COMPLETED', 'b': 'FAILED'}
+    assert wkquery.sleeps == [10, 20, 30, 10]
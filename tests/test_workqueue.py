@@ -0,0 +1,60 @@
+import pandas as pd
+
+import gbio.src.process as prc
+import gbio.src.workqueue as wq
+
+from conftest import write_city
+
+
+def sorted_table(path):
+    df = pd.read_csv(path, index_col="id", float_precision="round_trip")
+    return df.sort_values(['full_name', 'variation']).reset_index(drop=True)
+
+
+def test_local_workers_match_serial_build(raw_dir, tmp_path, local_gbif):
+    write_city(raw_dir, city="Otherville", seed=1)
+    serial = tmp_path / "serial"
+    serial.mkdir()
+    prc.process_sats(raw_dir, str(tmp_path / "out_serial"), str(serial))
+
+    queue_path = str(tmp_path / "queue.sqlite")
+    wq.WorkQueue(queue_path).enqueue(raw_dir, occurrence_store=str(tmp_path / "occ.csv"))
+    built = wq.run_local_workers(queue_path, str(tmp_path / "out"), str(tmp_path / "parts"),
+                                 processes=2, batch=4, cache_dir=str(tmp_path / "worker_cache"))
+    assert built == 18
+    assert wq.WorkQueue(queue_path).progress() == {'done': 18}
+    assert (tmp_path / "worker_cache" / "species_cache.sqlite").exists()
+
+    merged = tmp_path / "merged"
+    wq.merge_parts(queue_path, str(tmp_path / "parts"), str(merged))
+    for city in ["Testville", "Otherville"]:
+        pd.testing.assert_frame_equal(sorted_table(merged / f"{city}.csv"), sorted_table(serial / f"{city}.csv"))
+
+
+def test_worker_survives_failing_tiles_and_renews_whole_claim(raw_dir, tmp_path, local_gbif, monkeypatch):
+    write_city(raw_dir, city="Otherville", seed=1)
+    broken = "tile_52.1_-1.9.tif"
+    process_img = prc.process_img
+
+    def flaky(img_path, **kwargs):
+        if img_path.endswith(f"Otherville/{broken}"):
+            raise OSError("disk full")
+        return process_img(img_path, **kwargs)
+    monkeypatch.setattr(prc, "process_img", flaky)
+
+    renewed = []
+    renew = wq.WorkQueue.renew
+    def spy(self, owner, tiles, lease_seconds=wq.LEASE_SECONDS):
+        renewed.append(set(tiles))
+        return renew(self, owner, tiles, lease_seconds=lease_seconds)
+    monkeypatch.setattr(wq.WorkQueue, "renew", spy)
+
+    queue_path = str(tmp_path / "queue.sqlite")
+    queue = wq.WorkQueue(queue_path)
+    queue.enqueue(raw_dir)
+    assert wq.run_worker(queue_path, str(tmp_path / "out"), str(tmp_path / "parts"), batch=18, owner="w1") == 17
+
+    assert queue.progress() == {'done': 17, 'failed': 1}
+    assert queue.tiles(state='failed') == [("Otherville", broken, 'failed', 'error_OSError')]
+    # Renewals while building the first city also kept the second city's tiles leased
+    assert {c for c, _ in renewed[0]} == {"Otherville", "Testville"}